@@ -0,0 +1,68 @@
+import argparse
+from pathlib import Path
+import sys
+import time
+import numpy as np
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+
+import utils.metrics as metrics
+
+METRICS = {
+    "psnr": metrics.psnr,
+    "psnr_per_channel": metrics.psnr_per_channel,
+    "weighted_psnr": metrics.weighted_psnr,
+    "ssim": metrics.ssim,
+    "histogram_chi_square": metrics.histogram_chi_square,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Quality metrics throughput on synthetic RGB images"
+    )
+    parser.add_argument(
+        "-s",
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[256, 512, 1024, 2048, 4096],
+        help="Square image sizes in pixels",
+    )
+    parser.add_argument(
+        "-r", "--repeat", type=int, default=3, help="Runs per measurement (best kept)"
+    )
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+
+    print(f"{'size':>10} {'metric':>22} {'time, s':>10} {'MP/s':>10}")
+    for size in args.sizes:
+        original = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+        # LSB-matching-like distortion: +-1 on about half of the samples
+        noise = rng.integers(-1, 2, original.shape, dtype=np.int16)
+        distorted = np.clip(original + noise, 0, 255).astype(np.uint8)
+
+        megapixels = size * size / 1e6
+        for name, metric in METRICS.items():
+            elapsed = measure(metric, original, distorted, args.repeat)
+            print(
+                f"{f'{size}x{size}':>10} {name:>22} {elapsed:>10.4f} "
+                f"{megapixels / elapsed:>10.1f}"
+            )
+
+
+def measure(metric, original, distorted, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        metric(original, distorted)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    main()
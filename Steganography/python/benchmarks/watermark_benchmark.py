@@ -0,0 +1,105 @@
+import argparse
+from pathlib import Path
+import sys
+import tempfile
+import time
+from PIL import Image
+import numpy as np
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+if str(ROOT_DIR / "lab2") not in sys.path:
+    sys.path.append(str(ROOT_DIR / "lab2"))
+
+import digital_watermark
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Watermark bit error rate and runtime against redundancy"
+    )
+    parser.add_argument(
+        "-i", "--image", help="Cover image (defaults to a synthetic 1024x1024 one)"
+    )
+    parser.add_argument(
+        "-b", "--bits", type=int, default=4096, help="Watermark length in bits"
+    )
+    parser.add_argument(
+        "-R",
+        "--redundancy",
+        type=int,
+        nargs="+",
+        default=[1, 3, 5, 7, 9],
+        help="Copies of every bit",
+    )
+    parser.add_argument(
+        "-n",
+        "--noise",
+        type=float,
+        default=2.0,
+        help="Standard deviation of Gaussian noise added to the stego image",
+    )
+    parser.add_argument("-q", type=float, default=0.5, help="Embedding strength")
+    parser.add_argument("-c", type=int, default=2, help="Prediction cross radius")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    watermark_bytes = rng.integers(0, 256, args.bits // 8, dtype=np.uint8).tobytes()
+    watermark_bits = np.unpackbits(np.frombuffer(watermark_bytes, dtype=np.uint8))
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cover_path = args.image or str(Path(temp_dir) / "cover.bmp")
+        if not args.image:
+            synthetic_cover(rng, 1024).save(cover_path)
+        stego_path = str(Path(temp_dir) / "stego.bmp")
+
+        print(f"{'R':>4} {'BER':>10} {'embed, s':>10} {'extract, s':>12}")
+        for redundancy in args.redundancy:
+            start = time.perf_counter()
+            stego, coords = digital_watermark.embed_watermark(
+                cover_path, watermark_bytes, args.q, redundancy=redundancy
+            )
+            embed_time = time.perf_counter() - start
+
+            add_noise(stego, rng, args.noise).save(stego_path)
+
+            start = time.perf_counter()
+            extracted = digital_watermark.extract_watermark(
+                stego_path, coords, args.c, redundancy
+            )
+            extract_time = time.perf_counter() - start
+
+            ber = np.mean(np.asarray(extracted, dtype=np.uint8) != watermark_bits)
+            print(
+                f"{redundancy:>4} {ber:>10.5f} {embed_time:>10.4f} {extract_time:>12.4f}"
+            )
+
+
+def synthetic_cover(rng, size):
+    # Smooth gradients with mild texture: the cross predictor assumes
+    # neighboring pixels are correlated, which pure noise is not
+    y, x = np.mgrid[0:size, 0:size] / size
+    channels = [
+        128 + 100 * np.sin(2 * np.pi * (x + y)),
+        128 + 100 * np.cos(3 * np.pi * x),
+        128 + 100 * np.sin(4 * np.pi * y),
+    ]
+    image = np.stack(channels, axis=-1) + rng.normal(0, 2, (size, size, 3))
+    return Image.fromarray(np.clip(image, 0, 255).astype(np.uint8))
+
+
+def add_noise(image, rng, sigma):
+    if sigma <= 0:
+        return image
+
+    image_array = np.asarray(image, dtype=np.float32)
+    noisy = image_array + rng.normal(0, sigma, image_array.shape)
+    noisy = np.clip(np.rint(noisy), 0, 255).astype(np.uint8)
+    # Keep the green LSBs so the overflow flags survive as they would in
+    # any attack that leaves the green channel alone
+    noisy[..., 1] = image_array[..., 1]
+    return Image.fromarray(noisy)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import struct
+from typing import NamedTuple
+
+import numpy as np
+
+FILE_HEADER_SIZE = 14
+INFO_HEADER_MIN_SIZE = 40
+BI_RGB = 0
+ROW_ALIGNMENT = 4
+
+
+class BmpHeader(NamedTuple):
+    width: int
+    height: int
+    bit_count: int
+    compression: int
+    pixel_offset: int
+    top_down: bool
+
+    @property
+    def mode(self) -> str:
+        return "P" if self.bit_count == 8 else "RGB"
+
+    @property
+    def bytes_per_pixel(self) -> int:
+        return self.bit_count // 8
+
+    @property
+    def channels(self) -> int:
+        return 1 if self.bit_count == 8 else 3
+
+    @property
+    def row_stride(self) -> int:
+        row_bytes = self.width * self.bytes_per_pixel
+        return (row_bytes + ROW_ALIGNMENT - 1) // ROW_ALIGNMENT * ROW_ALIGNMENT
+
+    @property
+    def row_samples(self) -> int:
+        return self.width * self.channels
+
+    @property
+    def total_samples(self) -> int:
+        return self.height * self.row_samples
+
+
+def read_header(path) -> BmpHeader:
+    with open(path, "rb") as f:
+        data = f.read(FILE_HEADER_SIZE + INFO_HEADER_MIN_SIZE)
+
+    if len(data) < FILE_HEADER_SIZE + INFO_HEADER_MIN_SIZE or data[:2] != b"BM":
+        raise ValueError("Not a BMP image")
+
+    (pixel_offset,) = struct.unpack_from("<I", data, 10)
+    info_size, width, height, _, bit_count, compression = struct.unpack_from(
+        "<IiiHHI", data, FILE_HEADER_SIZE
+    )
+    if info_size < INFO_HEADER_MIN_SIZE:
+        raise ValueError("Unsupported BMP header version")
+
+    return BmpHeader(
+        width=width,
+        height=abs(height),
+        bit_count=bit_count,
+        compression=compression,
+        pixel_offset=pixel_offset,
+        top_down=height < 0,
+    )
+
+
+def is_streamable(header: BmpHeader) -> bool:
+    # Only uncompressed 8-bit indexed/grayscale and 24/32-bit BGR(X) images
+    # have a pixel layout that can be addressed directly
+    return header.compression == BI_RGB and header.bit_count in (8, 24, 32)
+
+
+def map_pixels(path, header: BmpHeader) -> np.memmap:
+    if not is_streamable(header):
+        raise ValueError(
+            "Only uncompressed 8, 24 or 32-bit BMP images can be memory-mapped."
+        )
+
+    return np.memmap(
+        path,
+        dtype=np.uint8,
+        mode="r",
+        offset=header.pixel_offset,
+        shape=(header.height, header.row_stride),
+    )
+
+
+def read_samples(
+    pixels: np.memmap, header: BmpHeader, start: int, count: int
+) -> np.ndarray:
+    # Samples are returned in the same order as np.array(Image.open(path))
+    # flattens them: top-down rows, left-to-right pixels, RGB channels
+    if start < 0 or start + count > header.total_samples:
+        raise ValueError("Requested samples are outside the image")
+
+    samples = np.empty(count, dtype=np.uint8)
+    first_row, offset = divmod(start, header.row_samples)
+    filled = 0
+    row = first_row
+    while filled < count:
+        row_data = _read_row(pixels, header, row)
+        chunk = row_data[offset : offset + count - filled]
+        samples[filled : filled + chunk.size] = chunk
+        filled += chunk.size
+        offset = 0
+        row += 1
+
+    return samples
+
+
+def gather_samples(
+    pixels: np.memmap, header: BmpHeader, indices: np.ndarray
+) -> np.ndarray:
+    # Same sample order as read_samples, but for arbitrary flat indices
+    rows, columns = np.divmod(indices, header.row_samples)
+    if not header.top_down:
+        rows = header.height - 1 - rows
+
+    if header.channels > 1:
+        # RGB -> BGR(X) byte offsets
+        pixel, channel = np.divmod(columns, header.channels)
+        columns = pixel * header.bytes_per_pixel + (2 - channel)
+
+    return pixels[rows, columns]
+
+
+def _read_row(pixels: np.memmap, header: BmpHeader, row: int) -> np.ndarray:
+    # Rows are stored bottom-up unless the height in the header is negative
+    file_row = row if header.top_down else header.height - 1 - row
+    row_bytes = pixels[file_row, : header.width * header.bytes_per_pixel]
+
+    if header.channels == 1:
+        return row_bytes
+
+    # BGR(X) -> RGB
+    return row_bytes.reshape(header.width, header.bytes_per_pixel)[:, 2::-1].reshape(-1)
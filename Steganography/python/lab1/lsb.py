@@ -1,166 +1,277 @@
+from typing import Callable, Optional, Tuple
 from PIL import Image
 import numpy as np
 
+import bmp
+import utils.permutation as permutation
+
 BITS_PER_BYTE = 8
 BYTE_ORDER = "big"
 MESSAGE_LENGTH_BYTES = 4
+LENGTH_BITS_COUNT = MESSAGE_LENGTH_BYTES * BITS_PER_BYTE
+MAX_BITS_PER_SAMPLE = 4
+# The two most significant bits of the length prefix store bits per sample
+# minus one, so 1-bit images keep the original format
+BITS_PER_SAMPLE_SHIFT = LENGTH_BITS_COUNT - 2
+MAX_MESSAGE_LENGTH = (1 << BITS_PER_SAMPLE_SHIFT) - 1
 
 
 def embed_lsb_matching(
-    image_array: np.ndarray, mode: str, message_bytes: bytes
+    image_array: np.ndarray,
+    mode: str,
+    message_bytes: bytes,
+    bits_per_sample: int = 1,
+    key: Optional[int] = None,
+    rng: Optional[np.random.Generator] = None,
 ) -> Image.Image:
     match mode:
         case "P" | "L":
-            return embed_lsb_matching_8bit(image_array, message_bytes)
+            return embed_lsb_matching_8bit(
+                image_array, message_bytes, bits_per_sample, key, rng
+            )
         case "RGB":
-            return embed_lsb_matching_24bit(image_array, message_bytes)
+            return embed_lsb_matching_24bit(
+                image_array, message_bytes, bits_per_sample, key, rng
+            )
         case _:
             raise ValueError(
                 "Only 24-bit, 8-bit indexed or grayscale BMP images are supported."
             )
 
 
-def extract_lsb_matching(stego_array: np.ndarray, mode: str) -> Image.Image:
+def extract_lsb_matching(
+    stego_array: np.ndarray, mode: str, key: Optional[int] = None
+) -> Image.Image:
     match mode:
         case "P" | "L":
-            return extract_lsb_matching_8bit(stego_array)
+            return extract_lsb_matching_8bit(stego_array, key)
         case "RGB":
-            return extract_lsb_matching_24bit(stego_array)
+            return extract_lsb_matching_24bit(stego_array, key)
         case _:
             raise ValueError(
                 "Only 24-bit, 8-bit indexed or grayscale BMP images are supported."
             )
 
 
-def prepare_for_lsb(image_array: np.ndarray, message_bytes: bytes):
+def capacity_bytes(sample_count: int, bits_per_sample: int = 1) -> int:
+    # The message length prefix always takes one bit in each of 32 samples
+    payload_samples = max(0, sample_count - LENGTH_BITS_COUNT)
+    return min(MAX_MESSAGE_LENGTH, payload_samples * bits_per_sample // BITS_PER_BYTE)
+
+
+def prepare_for_lsb(
+    image_array: np.ndarray, message_bytes: bytes, bits_per_sample: int = 1
+) -> Tuple[np.ndarray, np.ndarray]:
     if not isinstance(message_bytes, bytes):
         raise ValueError("Message must be bytes")
 
-    # Add the message length (4 bytes) to the beginning
+    if not 1 <= bits_per_sample <= MAX_BITS_PER_SAMPLE:
+        raise ValueError(f"Bits per sample must be between 1 and {MAX_BITS_PER_SAMPLE}")
+
     message_length = len(message_bytes)
-    length_bytes = message_length.to_bytes(MESSAGE_LENGTH_BYTES, byteorder=BYTE_ORDER)
-    full_message = length_bytes + message_bytes
-    message_bits = "".join([format(byte, "08b") for byte in full_message])
+    if message_length > MAX_MESSAGE_LENGTH:
+        raise ValueError("The message is too big to fit in the image")
+
+    # The message length (4 bytes) goes to the beginning, one bit per sample
+    header = (bits_per_sample - 1) << BITS_PER_SAMPLE_SHIFT | message_length
+    header_bytes = header.to_bytes(MESSAGE_LENGTH_BYTES, byteorder=BYTE_ORDER)
+    header_bits = np.unpackbits(np.frombuffer(header_bytes, dtype=np.uint8))
+
+    message_bits = np.unpackbits(np.frombuffer(message_bytes, dtype=np.uint8))
+    message_symbols = _bits_to_symbols(message_bits, bits_per_sample)
 
     # Check capacity
     total_pixels = image_array.size
-    required_pixels = len(message_bits)
+    required_pixels = LENGTH_BITS_COUNT + message_symbols.size
     if required_pixels > total_pixels:
         raise ValueError("The message is too big to fit in the image")
 
-    return message_bits
+    return header_bits, message_symbols
 
 
 def embed_lsb_matching_8bit(
-    image_array: np.ndarray, message_bytes: bytes
+    image_array: np.ndarray,
+    message_bytes: bytes,
+    bits_per_sample: int = 1,
+    key: Optional[int] = None,
+    rng: Optional[np.random.Generator] = None,
 ) -> np.ndarray:
-    message_bits = prepare_for_lsb(image_array, message_bytes)
+    # A fresh generator per embed: forked batch workers would otherwise share
+    # the global random state and repeat the same +-1 sequence
+    if rng is None:
+        rng = np.random.default_rng()
 
-    image_array = image_array.copy()
-    flat_array = image_array.flatten()
-    for i in range(len(message_bits)):
-        message_bit = int(message_bits[i])
+    header_bits, message_symbols = prepare_for_lsb(
+        image_array, message_bytes, bits_per_sample
+    )
+
+    embedded_array = image_array.copy()
+    flat_array = embedded_array.reshape(-1)
+    payload_end = LENGTH_BITS_COUNT + message_symbols.size
+
+    if key is None:
+        samples = flat_array[:payload_end]
+    else:
+        # Scattered mode: gather the keyed positions, embed, scatter back
+        positions = permutation.keyed_positions(key, flat_array.size, 0, payload_end)
+        samples = flat_array[positions]
 
-        if (flat_array[i] & 1) != message_bit:
-            # Randomly change LSB if bits are not equal
-            if flat_array[i] == 255:
-                flat_array[i] -= 1
-            elif flat_array[i] == 0:
-                flat_array[i] += 1
-            else:
-                flat_array[i] += np.random.choice([-1, 1])
+    _embed_symbols(samples[:LENGTH_BITS_COUNT], header_bits, 1, rng)
+    _embed_symbols(samples[LENGTH_BITS_COUNT:], message_symbols, bits_per_sample, rng)
 
-    # Reshape embedded image in 2d
-    embedded_array = flat_array.reshape(image_array.shape)
+    if key is not None:
+        flat_array[positions] = samples
 
     return embedded_array
 
 
 def embed_lsb_matching_24bit(
-    image_array: np.ndarray, message_bytes: bytes
+    image_array: np.ndarray,
+    message_bytes: bytes,
+    bits_per_sample: int = 1,
+    key: Optional[int] = None,
+    rng: Optional[np.random.Generator] = None,
 ) -> np.ndarray:
-    message_bits = prepare_for_lsb(image_array, message_bytes)
+    # Samples are visited row by row, pixel by pixel, channel by channel,
+    # which is exactly the C-order of the flat array
+    return embed_lsb_matching_8bit(
+        image_array, message_bytes, bits_per_sample, key, rng
+    )
+
 
-    image_array = image_array.copy()
+def extract_lsb_matching_8bit(
+    image_array: np.ndarray, key: Optional[int] = None
+) -> bytes:
+    flat_array = image_array.reshape(-1)
 
-    bit_index = 0
-    for row in image_array:
-        for pixel in row:
-            for channel in range(3):  # B, G, R
-                if bit_index >= len(message_bits):
-                    break
-                bit = int(message_bits[bit_index])
-                if (pixel[channel] & 1) != bit:
-                    # Randomly change LSB if bits are not equal
-                    if pixel[channel] == 255:
-                        pixel[channel] -= 1
-                    elif pixel[channel] == 0:
-                        pixel[channel] += 1
-                    else:
-                        pixel[channel] += np.random.choice([-1, 1])
-                bit_index += 1
+    if key is None:
+        return _extract_message(
+            lambda start, count: flat_array[start : start + count], flat_array.size
+        )
 
-    return image_array
+    return _extract_message(
+        lambda start, count: flat_array[
+            permutation.keyed_positions(key, flat_array.size, start, count)
+        ],
+        flat_array.size,
+    )
 
 
-def extract_lsb_matching_8bit(image_array: np.ndarray) -> bytes:
-    image_array = image_array.copy()
-    flat_img = image_array.flatten()
+def extract_lsb_matching_24bit(
+    image_array: np.ndarray, key: Optional[int] = None
+) -> bytes:
+    return extract_lsb_matching_8bit(image_array, key)
 
-    length_bits_count = MESSAGE_LENGTH_BYTES * BITS_PER_BYTE
 
-    # Extract message length (first 32 bits)
-    length_bits = [str(pixel & 1) for pixel in flat_img[:length_bits_count]]
-    length = int("".join(length_bits), 2)
+def extract_lsb_matching_file(path, key: Optional[int] = None) -> bytes:
+    # Reads only the length prefix and the message samples straight from the
+    # memory-mapped pixel area, without decoding the whole image
+    header = bmp.read_header(path)
+    pixels = bmp.map_pixels(path, header)
+
+    if key is None:
+        return _extract_message(
+            lambda start, count: bmp.read_samples(pixels, header, start, count),
+            header.total_samples,
+        )
+
+    return _extract_message(
+        lambda start, count: bmp.gather_samples(
+            pixels,
+            header,
+            permutation.keyed_positions(key, header.total_samples, start, count),
+        ),
+        header.total_samples,
+    )
 
-    # Extract message
-    message_bits = []
-    for i in range(length_bits_count, length_bits_count + length * BITS_PER_BYTE):
-        message_bits.append(str(flat_img[i] & 1))
 
-    # Convert message bits to bytes
-    return bits_str_to_bytes(message_bits, length)
+def _embed_symbols(
+    samples: np.ndarray,
+    symbols: np.ndarray,
+    bits_per_sample: int,
+    rng: np.random.Generator,
+) -> None:
+    if bits_per_sample == 1:
+        _embed_bits(samples, symbols, rng)
+        return
 
+    # Replace the low bits, then move by 2^k towards the original value when
+    # that is closer and stays in range (optimal pixel adjustment)
+    step = 1 << bits_per_sample
+    values = samples.astype(np.int16)
+    embedded = (values & ~(step - 1)) | symbols
+    diff = embedded - values
 
-def extract_lsb_matching_24bit(image_array: np.ndarray):
-    image_array = image_array.copy()
+    lower = (diff > step // 2) & (embedded >= step)
+    upper = (diff < -step // 2) & (embedded + step <= 255)
+    embedded[lower] -= step
+    embedded[upper] += step
 
-    length_bits_count = MESSAGE_LENGTH_BYTES * BITS_PER_BYTE
+    samples[:] = embedded
+
+
+def _embed_bits(
+    samples: np.ndarray, message_bits: np.ndarray, rng: np.random.Generator
+) -> None:
+    mismatch = np.flatnonzero((samples & 1) != message_bits)
+
+    # Randomly change LSB if bits are not equal, keeping 0 and 255 in range
+    values = samples[mismatch].astype(np.int16)
+    deltas = rng.choice(np.array([-1, 1], dtype=np.int16), size=values.size)
+    deltas[values == 255] = -1
+    deltas[values == 0] = 1
+
+    samples[mismatch] = values + deltas
+
+
+def _extract_message(
+    read_samples: Callable[[int, int], np.ndarray], total_samples: int
+) -> bytes:
+    # read_samples(start, count) returns samples in embedding order
+    if total_samples < LENGTH_BITS_COUNT:
+        raise ValueError("The image is too small to contain a message")
 
     # Extract message length (first 32 bits)
-    length_bits = []
-    bit_count = 0
-    for row in image_array:
-        for pixel in row:
-            for channel in range(3):
-                if bit_count >= length_bits_count:
-                    break
-                length_bits.append(str(pixel[channel] & 1))
-                bit_count += 1
-
-    length = int("".join(length_bits), 2)
-
-    # Extract message
-    message_bits = []
-    total_bits = length_bits_count + length * BITS_PER_BYTE
-    bit_count = 0
-    for row in image_array:
-        for pixel in row:
-            for channel in range(3):
-                if bit_count >= total_bits:
-                    break
-                if bit_count >= length_bits_count:  # Skip length
-                    message_bits.append(str(pixel[channel] & 1))
-                bit_count += 1
-
-    # Convert message bits to bytes
-    return bits_str_to_bytes(message_bits, length)
-
-
-def bits_str_to_bytes(bits: str, length: int) -> bytes:
-    return bytes(
-        [
-            int("".join(bits[i * BITS_PER_BYTE : (i + 1) * BITS_PER_BYTE]), 2)
-            for i in range(length)
-        ]
+    bits_per_sample, length = _parse_header(read_samples(0, LENGTH_BITS_COUNT))
+
+    message_samples_count = _samples_for(length, bits_per_sample)
+    if LENGTH_BITS_COUNT + message_samples_count > total_samples:
+        raise ValueError("Message length exceeds the image capacity")
+
+    return _symbols_to_bytes(
+        read_samples(LENGTH_BITS_COUNT, message_samples_count), bits_per_sample, length
     )
+
+
+def _parse_header(length_samples: np.ndarray) -> Tuple[int, int]:
+    header_bytes = np.packbits(length_samples & 1).tobytes()
+    header = int.from_bytes(header_bytes, byteorder=BYTE_ORDER)
+
+    bits_per_sample = (header >> BITS_PER_SAMPLE_SHIFT) + 1
+    length = header & MAX_MESSAGE_LENGTH
+    return bits_per_sample, length
+
+
+def _samples_for(length: int, bits_per_sample: int) -> int:
+    return -(-length * BITS_PER_BYTE // bits_per_sample)  # Ceiling division
+
+
+def _bits_to_symbols(bits: np.ndarray, bits_per_sample: int) -> np.ndarray:
+    if bits_per_sample == 1:
+        return bits
+
+    # Pad the tail with zeros and read every k bits as one big-endian symbol
+    symbol_count = -(-bits.size // bits_per_sample)
+    padded = np.zeros(symbol_count * bits_per_sample, dtype=np.uint8)
+    padded[: bits.size] = bits
+    weights = 1 << np.arange(bits_per_sample - 1, -1, -1, dtype=np.uint8)
+    return padded.reshape(-1, bits_per_sample) @ weights
+
+
+def _symbols_to_bytes(samples: np.ndarray, bits_per_sample: int, length: int) -> bytes:
+    if bits_per_sample == 1:
+        return np.packbits(samples & 1).tobytes()
+
+    shifts = np.arange(bits_per_sample - 1, -1, -1, dtype=np.uint8)
+    bits = (samples[:, None] >> shifts) & 1
+    return np.packbits(bits.reshape(-1)[: length * BITS_PER_BYTE]).tobytes()
@@ -1,7 +1,14 @@
 import argparse
+import bisect
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import csv
+from functools import partial
+import json
+import math
 import os
 from pathlib import Path
 import sys
+import time
 from PIL import Image
 import numpy as np
 
@@ -10,9 +17,13 @@ ROOT_DIR = Path(__file__).resolve().parent.parent
 if str(ROOT_DIR) not in sys.path:
     sys.path.append(str(ROOT_DIR))
 
+import bmp
 import lsb
 import utils.stego as stego
 
+METRICS = ("psnr", "attack")
+MODE_CHANNELS = {"P": 1, "L": 1, "RGB": 3}
+
 
 def main():
     parser = argparse.ArgumentParser(description="LSB Stenography for 8-bit BMP images")
@@ -22,10 +33,94 @@ def main():
     enc.add_argument("-m", "--message", required=True, help="Message file")
     enc.add_argument("-i", "--input", required=True, help="Input BMP image")
     enc.add_argument("-o", "--output", required=True, help="Output stego image")
+    add_bits_per_sample_argument(enc)
+    add_key_argument(enc)
+    add_metrics_arguments(enc)
 
     dec = subparsers.add_parser("decode", help="Decode message from image")
     dec.add_argument("-i", "--input", required=True, help="Input BMP image")
     dec.add_argument("-o", "--output", required=True, help="Output message file")
+    add_key_argument(dec)
+
+    batch = subparsers.add_parser(
+        "batch", help="Encode or decode many images listed in a manifest"
+    )
+    batch.add_argument(
+        "manifest",
+        help="CSV file with a header row or JSON lines file (.jsonl) with "
+        "image, message and output fields",
+    )
+    batch.add_argument(
+        "-a",
+        "--action",
+        choices=("encode", "decode"),
+        default="encode",
+        help="Operation to run for every manifest entry",
+    )
+    batch.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of worker processes",
+    )
+    batch.add_argument(
+        "-r", "--results", help="Output JSON lines file (defaults to stdout)"
+    )
+    add_bits_per_sample_argument(batch)
+    add_key_argument(batch)
+    add_metrics_arguments(batch)
+
+    analyze = subparsers.add_parser(
+        "analyze", help="Compute analysis artifacts for stored stego images"
+    )
+    analyze.add_argument(
+        "manifest",
+        help="CSV file with a header row or JSON lines file (.jsonl) with "
+        "image (original) and output (stego) fields",
+    )
+    analyze.add_argument(
+        "--metrics",
+        nargs="+",
+        choices=METRICS,
+        default=list(METRICS),
+        help="Analysis artifacts to produce",
+    )
+    analyze.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of worker processes",
+    )
+    analyze.add_argument(
+        "-r", "--results", help="Output JSON lines file (defaults to stdout)"
+    )
+
+    plan = subparsers.add_parser(
+        "plan", help="Assign messages to containers by capacity into a manifest"
+    )
+    plan.add_argument(
+        "-c",
+        "--containers",
+        nargs="+",
+        required=True,
+        help="Container images or directories with them",
+    )
+    plan.add_argument(
+        "-m",
+        "--messages",
+        nargs="+",
+        required=True,
+        help="Message files or directories with them",
+    )
+    plan.add_argument(
+        "-o", "--output-dir", required=True, help="Directory for stego images"
+    )
+    plan.add_argument(
+        "-r", "--results", help="Output manifest CSV file (defaults to stdout)"
+    )
+    add_bits_per_sample_argument(plan)
 
     args = parser.parse_args()
 
@@ -33,48 +128,377 @@ def main():
         encode_cmd(args)
     elif args.command == "decode":
         decode_cmd(args)
+    elif args.command == "batch":
+        batch_cmd(args)
+    elif args.command == "analyze":
+        analyze_cmd(args)
+    elif args.command == "plan":
+        plan_cmd(args)
 
 
-def encode_cmd(args):
-    image = load_image(args.input)
-    message = open(args.message, "rb").read()
+def add_bits_per_sample_argument(parser):
+    parser.add_argument(
+        "-k",
+        "--bits-per-sample",
+        type=int,
+        choices=range(1, lsb.MAX_BITS_PER_SAMPLE + 1),
+        default=1,
+        help="Payload bits embedded into each sample (decode detects it)",
+    )
 
-    image_array = np.array(image)
-    capacity = len(image_array.flatten()) // lsb.BITS_PER_BYTE
 
-    if len(message) > capacity:
-        raise ValueError(
-            f"Message too large. Capacity: {capacity} bytes, message: {len(message)} bytes"
-        )
+def add_key_argument(parser):
+    parser.add_argument(
+        "--key",
+        type=int,
+        help="Scatter the message over keyed pseudo-random positions "
+        "(the same key is required to decode)",
+    )
+
+
+def add_metrics_arguments(parser):
+    parser.add_argument(
+        "--fast",
+        action="store_true",
+        help="Skip all analysis artifacts unless requested with --metrics",
+    )
+    parser.add_argument(
+        "--metrics",
+        nargs="*",
+        choices=METRICS,
+        help="Analysis artifacts to produce (default: all, or none with --fast)",
+    )
 
-    stego_array = lsb.embed_lsb_matching(image_array, image.mode, message)
-    stego_img = Image.fromarray(stego_array)
+
+def selected_metrics(args):
+    if args.metrics is not None:
+        return tuple(args.metrics)
+    return () if args.fast else METRICS
+
+
+def encode_cmd(args):
+    result = encode_file(
+        args.input,
+        args.message,
+        args.output,
+        selected_metrics(args),
+        args.bits_per_sample,
+        args.key,
+    )
+    capacity = result["capacity"]
+    message_size = result["message_size"]
 
     print("Embedding analysis:")
     print(f"- Capacity: {capacity} bytes")
     print(
-        f"- Message size: {len(message)} bytes ({len(message) / capacity * 100:.1f}%)"
+        f"- Message size: {message_size} bytes ({message_size / capacity * 100:.1f}%)"
     )
-    print(f"- PSNR: {stego.psnr(image_array, stego_array, image.mode):.2f} dB")
+    print_analysis(result)
 
-    attack_path = os.path.splitext(args.output)[0] + "_difference.bmp"
-    attack_img = stego.generate_lsb_attack_image(stego_img)
 
-    attack_img.save(attack_path)
-    print(f"Visual attack image saved to {attack_path}")
+def decode_cmd(args):
+    decode_file(args.input, args.output, args.key)
 
-    stego_img.save(args.output)
 
+def batch_cmd(args):
+    manifest_entries = read_manifest(args.manifest, args.action)
+    if args.action == "encode":
+        worker = partial(
+            encode_entry,
+            metrics=selected_metrics(args),
+            bits_per_sample=args.bits_per_sample,
+            key=args.key,
+        )
+    else:
+        worker = partial(decode_entry, key=args.key)
 
-def decode_cmd(args):
-    stego_img = load_image(args.input)
-    stego_array = np.array(stego_img)
+    run_pool(manifest_entries, worker, args.workers, args.results)
+
+
+def analyze_cmd(args):
+    manifest_entries = read_manifest(args.manifest, "analyze")
+    worker = partial(analyze_entry, metrics=tuple(args.metrics))
+
+    run_pool(manifest_entries, worker, args.workers, args.results)
+
+
+def plan_cmd(args):
+    containers = []
+    for path in expand_paths(args.containers):
+        try:
+            capacity = probe_image(path, args.bits_per_sample)["capacity"]
+            containers.append((capacity, path))
+        except Exception as e:
+            print(f"Skipping container {path}: {e}", file=sys.stderr)
+
+    messages = [(os.path.getsize(path), path) for path in expand_paths(args.messages)]
 
-    message = lsb.extract_lsb_matching(stego_array, stego_img.mode)
+    assignments, unassigned = plan_assignments(containers, messages)
+
+    results_file = (
+        open(args.results, "w", newline="", encoding="utf-8")
+        if args.results
+        else sys.stdout
+    )
+    try:
+        writer = csv.writer(results_file)
+        writer.writerow(("image", "message", "output"))
+        for container, message in assignments:
+            output = os.path.join(args.output_dir, os.path.basename(container))
+            writer.writerow((container, message, output))
+    finally:
+        if results_file is not sys.stdout:
+            results_file.close()
+
+    for message in unassigned:
+        print(f"No container with enough capacity for {message}", file=sys.stderr)
+
+
+def plan_assignments(containers, messages):
+    # A container holds a single message, so this is best-fit decreasing:
+    # the largest messages are placed first, each into the smallest free
+    # container that still fits it
+    free = sorted(containers)
+    assignments = []
+    unassigned = []
+
+    for size, message in sorted(messages, reverse=True):
+        index = bisect.bisect_left(free, (size, ""))
+        if index == len(free):
+            unassigned.append(message)
+            continue
+
+        _, container = free.pop(index)
+        assignments.append((container, message))
+
+    return assignments, unassigned
+
+
+def expand_paths(paths):
+    expanded = []
+    for path in paths:
+        if os.path.isdir(path):
+            expanded.extend(
+                str(child) for child in sorted(Path(path).iterdir()) if child.is_file()
+            )
+        else:
+            expanded.append(path)
+    return expanded
+
+
+def print_analysis(result):
+    if "psnr" in result:
+        print(f"- PSNR: {result['psnr']:.2f} dB")
+    if "attack_path" in result:
+        print(f"Visual attack image saved to {result['attack_path']}")
+
+
+def run_pool(manifest_entries, worker, workers, results_path):
+    results_file = (
+        open(results_path, "w", encoding="utf-8") if results_path else sys.stdout
+    )
+    failed = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(worker, entry): entry for entry in manifest_entries
+            }
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # The worker process itself died
+                    result = _error_result(futures[future], e)
 
-    with open(args.output, "wb") as f:
+                if result["status"] != "ok":
+                    failed += 1
+
+                results_file.write(json.dumps(result) + "\n")
+                results_file.flush()
+    finally:
+        if results_file is not sys.stdout:
+            results_file.close()
+
+    print(
+        f"Processed {len(manifest_entries)} files, {failed} failed",
+        file=sys.stderr,
+    )
+
+
+def read_manifest(path, action):
+    required_fields = ("image", "message", "output")
+    if action in ("decode", "analyze"):
+        required_fields = ("image", "output")
+
+    with open(path, newline="", encoding="utf-8") as f:
+        if Path(path).suffix.lower() in (".jsonl", ".json"):
+            manifest_entries = [json.loads(line) for line in f if line.strip()]
+        else:
+            manifest_entries = list(csv.DictReader(f))
+
+    for line_number, entry in enumerate(manifest_entries, start=1):
+        missing = [field for field in required_fields if not entry.get(field)]
+        if missing:
+            raise ValueError(
+                f"Manifest entry {line_number} is missing: {', '.join(missing)}"
+            )
+
+    return manifest_entries
+
+
+def encode_entry(entry, metrics=METRICS, bits_per_sample=1, key=None):
+    return _run_entry(
+        entry,
+        encode_file,
+        entry["image"],
+        entry["message"],
+        entry["output"],
+        metrics,
+        bits_per_sample,
+        key,
+    )
+
+
+def decode_entry(entry, key=None):
+    return _run_entry(entry, decode_file, entry["image"], entry["output"], key)
+
+
+def analyze_entry(entry, metrics=METRICS):
+    return _run_entry(entry, analyze_file, entry["image"], entry["output"], metrics)
+
+
+def _run_entry(entry, func, *args):
+    start = time.perf_counter()
+    try:
+        result = func(*args)
+    except Exception as e:
+        return _error_result(entry, e, start)
+
+    if "psnr" in result and math.isinf(result["psnr"]):
+        result["psnr"] = None  # Identical images, not representable in JSON
+
+    return {
+        "image": entry["image"],
+        "output": entry["output"],
+        "status": "ok",
+        **result,
+        "time": time.perf_counter() - start,
+    }
+
+
+def _error_result(entry, error, start=None):
+    return {
+        "image": entry.get("image"),
+        "output": entry.get("output"),
+        "status": "error",
+        "error": f"{type(error).__name__}: {error}",
+        "time": time.perf_counter() - start if start is not None else None,
+    }
+
+
+def encode_file(
+    input_path,
+    message_path,
+    output_path,
+    metrics=METRICS,
+    bits_per_sample=1,
+    key=None,
+):
+    # Reject oversized messages before any pixel data is decoded
+    capacity = probe_image(input_path, bits_per_sample)["capacity"]
+    message_size = os.path.getsize(message_path)
+
+    if message_size > capacity:
+        raise ValueError(
+            f"Message too large. Capacity: {capacity} bytes, message: {message_size} bytes"
+        )
+
+    image = load_image(input_path)
+    message = open(message_path, "rb").read()
+
+    image_array = np.array(image)
+
+    stego_array = lsb.embed_lsb_matching(
+        image_array, image.mode, message, bits_per_sample, key
+    )
+    stego_img = Image.fromarray(stego_array)
+    stego_img.save(output_path)
+
+    return {
+        "capacity": capacity,
+        "message_size": len(message),
+        **analyze_arrays(
+            image_array, stego_img, stego_array, image.mode, output_path, metrics
+        ),
+    }
+
+
+def decode_file(input_path, output_path, key=None):
+    if is_streamable_bmp(input_path):
+        message = lsb.extract_lsb_matching_file(input_path, key)
+    else:
+        stego_img = load_image(input_path)
+        stego_array = np.array(stego_img)
+
+        message = lsb.extract_lsb_matching(stego_array, stego_img.mode, key)
+
+    with open(output_path, "wb") as f:
         f.write(message)
 
+    return {"message_size": len(message)}
+
+
+def analyze_file(original_path, stego_path, metrics=METRICS):
+    original_img = load_image(original_path)
+    stego_img = load_image(stego_path)
+
+    original_array = np.array(original_img)
+    stego_array = np.array(stego_img)
+    if original_array.shape != stego_array.shape:
+        raise ValueError("Original and stego images must be the same size")
+
+    return analyze_arrays(
+        original_array, stego_img, stego_array, original_img.mode, stego_path, metrics
+    )
+
+
+def analyze_arrays(
+    original_array, stego_img, stego_array, mode, stego_path, metrics=METRICS
+):
+    result = {}
+
+    if "psnr" in metrics:
+        result["psnr"] = stego.psnr(original_array, stego_array, mode)
+
+    if "attack" in metrics:
+        attack_path = os.path.splitext(stego_path)[0] + "_difference.bmp"
+        attack_img = stego.generate_lsb_attack_image(stego_img)
+        attack_img.save(attack_path)
+        result["attack_path"] = attack_path
+
+    return result
+
+
+def probe_image(path, bits_per_sample=1):
+    # Image.open only parses the header, pixel data is decoded lazily
+    with Image.open(path) as img:
+        width, height = img.size
+        mode = img.mode
+
+    if mode not in MODE_CHANNELS:
+        raise ValueError(
+            "Only 24-bit, 8-bit indexed or grayscale BMP images are supported."
+        )
+
+    return {
+        "width": width,
+        "height": height,
+        "mode": mode,
+        "capacity": lsb.capacity_bytes(
+            width * height * MODE_CHANNELS[mode], bits_per_sample
+        ),
+    }
+
 
 def load_image(path):
     img = Image.open(path)
@@ -85,5 +509,12 @@ def load_image(path):
     return img
 
 
+def is_streamable_bmp(path):
+    try:
+        return bmp.is_streamable(bmp.read_header(path))
+    except ValueError:
+        return False
+
+
 if __name__ == "__main__":
     main()
@@ -1,16 +1,38 @@
 from PIL import Image
 import numpy as np
-import random
+import struct
+import zlib
 from typing import Tuple, List
 
+import image_cache
+import utils.permutation as permutation
+
 PADDING_PIXELS = 4  # Padding for extraction
 
+# Binary key file: magic, kind, flags, the redundancy when flagged, then the
+# kind-specific payload
+KEY_MAGIC = b"DWMK"
+KEY_HEADER = struct.Struct("<4sBB")
+KEY_COORDINATES = 0  # Explicit (y, x) int32 pairs
+KEY_SEED = 1  # Seed and sizes, coordinates are regenerated on load
+KEY_FLAG_COMPRESSED = 1
+KEY_FLAG_REDUNDANCY = 2  # Keys without it were embedded once per bit
+KEY_REDUNDANCY = struct.Struct("<H")
+KEY_COUNT = struct.Struct("<I")
+KEY_SEED_PARAMS = struct.Struct("<qIII")  # seed, count, height, width
+
 
 def embed_watermark(
-    image_path: str, watermark_bytes: bytes, q: float = 0.5, seed: int = 42
-) -> Tuple[Image.Image, List[Tuple[int, int]]]:
-    img = Image.open(image_path).convert("RGB")
-    img_array = np.array(img, dtype=np.float32)
+    image_path: str,
+    watermark_bytes: bytes,
+    q: float = 0.5,
+    seed: int = 42,
+    redundancy: int = 1,
+) -> Tuple[Image.Image, np.ndarray]:
+    if redundancy < 1:
+        raise ValueError("Redundancy must be at least 1")
+
+    img_array = np.array(image_cache.load_rgb(image_path), dtype=np.float32)
     height, width, _ = img_array.shape
 
     # Convert text to binary bits
@@ -18,106 +40,210 @@ def embed_watermark(
 
     watermark_length = len(watermark_bits)
 
-    # Generate random coordinates for embedding
+    # Generate random coordinates for embedding, `redundancy` copies of the
+    # watermark one after another
     pixel_coords = _generate_embedding_coordinates(
-        height, width, watermark_length, seed
+        height, width, watermark_length * redundancy, seed
     )
 
     # Embed each bit into the image
-    _embed_bits(img_array, pixel_coords, watermark_bits, q)
+    _embed_bits(img_array, pixel_coords, np.tile(watermark_bits, redundancy), q)
 
     # Convert back to image
     img_array = np.clip(img_array, 0, 255).astype(np.uint8)
     return Image.fromarray(img_array), pixel_coords
 
 
-def _bytes_to_bits(bytes: str):
-    binary_string = "".join([format(byte, "08b") for byte in bytes])
-    return [int(bit) for bit in binary_string]
+def _bytes_to_bits(bytes: bytes) -> np.ndarray:
+    return np.unpackbits(np.frombuffer(bytes, dtype=np.uint8))
 
 
 def _generate_embedding_coordinates(
     height: int, width: int, required_count: int, seed: int
-) -> List[Tuple[int, int]]:
-    random.seed(seed)
-    total_pixels = (height - 2 * PADDING_PIXELS) * (width - 2 * PADDING_PIXELS)
+) -> np.ndarray:
+    inner_height = max(0, height - 2 * PADDING_PIXELS)
+    inner_width = max(0, width - 2 * PADDING_PIXELS)
+    total_pixels = inner_height * inner_width
 
     if required_count > total_pixels:
         raise ValueError("Watermark is too long for the image size")
 
-    available_pixels = [
-        (y, x)
-        for y in range(PADDING_PIXELS, height - PADDING_PIXELS)
-        for x in range(PADDING_PIXELS, width - PADDING_PIXELS)
-    ]
-    return random.sample(available_pixels, required_count)
+    # Distinct flat indices of the inner area from a keyed permutation. It
+    # does not depend on the NumPy version, so seed keys stay valid
+    flat_indices = permutation.keyed_positions(seed, total_pixels, 0, required_count)
+
+    ys, xs = np.divmod(flat_indices, inner_width)
+    coords = np.empty((required_count, 2), dtype=np.int32)
+    coords[:, 0] = ys + PADDING_PIXELS
+    coords[:, 1] = xs + PADDING_PIXELS
+    return coords
 
 
 def _embed_bits(
-    img_array: np.ndarray, coords: List[Tuple[int, int]], bits: List[int], q: float
+    img_array: np.ndarray, coords: np.ndarray, bits: np.ndarray, q: float
 ) -> None:
-    for i, (y, x) in enumerate(coords):
-        R, G, B = img_array[y, x]
-        L = 0.299 * R + 0.587 * G + 0.114 * B  # Luminance
-        message_bit = bits[i]
+    coords = np.asarray(coords, dtype=np.intp).reshape(-1, 2)
+    ys, xs = coords[:, 0], coords[:, 1]
+
+    pixels = img_array[ys, xs]
+    R, G, B = pixels[:, 0], pixels[:, 1], pixels[:, 2]
+    L = 0.299 * R + 0.587 * G + 0.114 * B  # Luminance
+    message_bits = np.asarray(bits, dtype=np.float32)
 
-        # Modify blue channel
-        img_array[y, x, 2] = B + (2 * message_bit - 1) * L * q
+    # Modify blue channel
+    blue = B + (2 * message_bits - 1) * L * q
 
-        # Handle overflow
-        overflow_flag = 0
-        if img_array[y, x, 2] > 255:
-            img_array[y, x, 2] = 255
-            overflow_flag = 1
-        elif img_array[y, x, 2] < 0:
-            img_array[y, x, 2] = 0
-            overflow_flag = 1
+    # Handle overflow
+    overflow_flags = ((blue > 255) | (blue < 0)).astype(np.int32)
+    img_array[ys, xs, 2] = np.clip(blue, 0, 255)
 
-        # Store overflow flag in LSB of green channel
-        img_array[y, x, 1] = (int(G) & 0xFE) | overflow_flag
+    # Store overflow flag in LSB of green channel
+    img_array[ys, xs, 1] = (G.astype(np.int32) & 0xFE) | overflow_flags
 
 
 def extract_watermark(
-    image_path: str, coords: List[Tuple[int, int]], c: int = 2
+    image_path: str, coords: np.ndarray, c: int = 2, redundancy: int = 1
 ) -> List[int]:
-    img = Image.open(image_path).convert("RGB")
-    img_array = np.array(img, dtype=np.float32)
-    watermark_bits = []
+    img_array = image_cache.load_rgb(image_path)
 
-    for y, x in coords:
-        B = img_array[y, x, 2]
-        G = img_array[y, x, 1]
-        overflow_flag = int(G) & 1  # Get overflow flag from LSB of green channel
+    coords = np.asarray(coords, dtype=np.intp).reshape(-1, 2)
+    if redundancy < 1 or len(coords) % redundancy != 0:
+        raise ValueError("Key length is not a multiple of the redundancy")
 
-        # Predict original B value
-        B_pred = _predict_blue_channel(img_array, y, x, c)
+    ys, xs = coords[:, 0], coords[:, 1]
 
-        # Recover the embedded bit
-        if overflow_flag == 1:
-            watermark_bits.append(1 if B == 255 else 0)
-        else:
-            watermark_bits.append(1 if (B - B_pred) > 0 else 0)
+    B = img_array[ys, xs, 2].astype(np.float32)
+    G = img_array[ys, xs, 1]
+    overflow_flags = (G & 1).astype(bool)  # Overflow flag from LSB of green
 
-    return watermark_bits
+    # Predict original B values
+    B_pred = _predict_blue_channel(img_array[..., 2], ys, xs, c)
 
+    # Recover the embedded bits
+    copy_bits = np.where(overflow_flags, B == 255, (B - B_pred) > 0)
+    if redundancy == 1:
+        return copy_bits.astype(np.uint8).tolist()
 
-def _predict_blue_channel(img_array: np.ndarray, y: int, x: int, c: int) -> float:
-    height, width, _ = img_array.shape
-    neighbors = []
+    # Majority vote over the copies; ties are settled by the summed
+    # prediction margin of the copies without overflow
+    votes = (2 * copy_bits.astype(np.int32) - 1).reshape(redundancy, -1).sum(axis=0)
+    margins = np.where(overflow_flags, 0, B - B_pred).reshape(redundancy, -1)
+    watermark_bits = np.where(votes != 0, votes > 0, margins.sum(axis=0) > 0)
+    return watermark_bits.astype(np.uint8).tolist()
 
-    # Collect vertical neighbors
-    for k in range(-c, c + 1):
-        if 0 <= y + k < height:
-            neighbors.append(img_array[y + k, x, 2])
 
-    # Collect horizontal neighbors
+def _predict_blue_channel(
+    blue: np.ndarray, ys: np.ndarray, xs: np.ndarray, c: int
+) -> np.ndarray:
+    height, width = blue.shape
+    sums = np.zeros(ys.size, dtype=np.int32)
+    counts = np.zeros(ys.size, dtype=np.int32)
+
+    # Cross of c vertical and c horizontal neighbors on each side of the
+    # center; neighbors outside the image are skipped
     for k in range(-c, c + 1):
-        if 0 <= x + k < width:
-            neighbors.append(img_array[y, x + k, 2])
+        if k == 0:
+            continue
+
+        rows = ys + k
+        inside = (rows >= 0) & (rows < height)
+        sums += np.where(inside, blue[np.clip(rows, 0, height - 1), xs], 0)
+        counts += inside
 
-    # Remove center pixel (added twice)
-    if len(neighbors) >= 2:
-        neighbors.remove(img_array[y, x, 2])
-        neighbors.remove(img_array[y, x, 2])
+        columns = xs + k
+        inside = (columns >= 0) & (columns < width)
+        sums += np.where(inside, blue[ys, np.clip(columns, 0, width - 1)], 0)
+        counts += inside
 
-    return (sum(neighbors) / (4 * c)) if neighbors else img_array[y, x, 2]
+    # The divisor stays 4c near the borders; without neighbors B is kept
+    predicted = sums.astype(np.float32) / np.float32(4 * c if c else 1)
+    return np.where(counts > 0, predicted, blue[ys, xs].astype(np.float32))
+
+
+def save_key(
+    path: str, coords: np.ndarray, compress: bool = True, redundancy: int = 1
+) -> None:
+    coords = np.asarray(coords, dtype="<i4").reshape(-1, 2)
+    data = coords.tobytes()
+    flags = 0
+    if compress:
+        data = zlib.compress(data)
+        flags |= KEY_FLAG_COMPRESSED
+
+    with open(path, "wb") as f:
+        _write_key_header(f, KEY_COORDINATES, flags, redundancy)
+        f.write(KEY_COUNT.pack(len(coords)))
+        f.write(data)
+
+
+def save_seed_key(
+    path: str, seed: int, count: int, height: int, width: int, redundancy: int = 1
+) -> None:
+    # count is the number of coordinates, i.e. watermark bits times redundancy
+    with open(path, "wb") as f:
+        _write_key_header(f, KEY_SEED, 0, redundancy)
+        f.write(KEY_SEED_PARAMS.pack(seed, count, height, width))
+
+
+def load_key(path: str) -> Tuple[np.ndarray, int]:
+    # Returns the coordinates and the redundancy they were embedded with
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if len(data) < KEY_HEADER.size:
+        raise ValueError("Key file is too short")
+
+    magic, kind, flags = KEY_HEADER.unpack_from(data)
+    if magic != KEY_MAGIC:
+        raise ValueError("Not a watermark key file")
+
+    offset = KEY_HEADER.size
+    redundancy = 1
+    if flags & KEY_FLAG_REDUNDANCY:
+        (redundancy,) = KEY_REDUNDANCY.unpack_from(data, offset)
+        offset += KEY_REDUNDANCY.size
+
+    if kind == KEY_COORDINATES:
+        (count,) = KEY_COUNT.unpack_from(data, offset)
+        payload = data[offset + KEY_COUNT.size :]
+        if flags & KEY_FLAG_COMPRESSED:
+            payload = zlib.decompress(payload)
+
+        coords = np.frombuffer(payload, dtype="<i4")
+        if coords.size != count * 2:
+            raise ValueError("Key file is corrupted")
+        coords = coords.reshape(count, 2).astype(np.int32)
+    elif kind == KEY_SEED:
+        seed, count, height, width = KEY_SEED_PARAMS.unpack_from(data, offset)
+        coords = _generate_embedding_coordinates(height, width, count, seed)
+    else:
+        raise ValueError(f"Unknown key kind: {kind}")
+
+    if redundancy < 1 or len(coords) % redundancy != 0:
+        raise ValueError("Key file is corrupted")
+    return coords, redundancy
+
+
+def _write_key_header(f, kind: int, flags: int, redundancy: int) -> None:
+    if redundancy < 1:
+        raise ValueError("Redundancy must be at least 1")
+
+    # Keys with a single copy keep the shorter format
+    if redundancy == 1:
+        f.write(KEY_HEADER.pack(KEY_MAGIC, kind, flags))
+        return
+
+    f.write(KEY_HEADER.pack(KEY_MAGIC, kind, flags | KEY_FLAG_REDUNDANCY))
+    f.write(KEY_REDUNDANCY.pack(redundancy))
+
+
+def parse_key_text(text: str) -> np.ndarray:
+    # Legacy "y,x,y,x,..." text keys
+    numbers = np.array(text.replace("\n", "").split(","), dtype=np.int32)
+    if numbers.size % 2 != 0:
+        raise ValueError("Expected pairs of numbers")
+    return numbers.reshape(-1, 2)
+
+
+def format_key_text(coords: np.ndarray) -> str:
+    return ",".join(map(str, np.asarray(coords).reshape(-1).tolist()))
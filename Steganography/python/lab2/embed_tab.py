@@ -10,12 +10,16 @@ from PyQt6.QtWidgets import (
     QFileDialog,
     QMessageBox,
     QScrollArea,
+    QSpinBox,
+    QProgressBar,
 )
+from PyQt6.QtCore import QThreadPool
 
 import digital_watermark
-import utils
+import preview
 from image_label import ImageLabel
-from safe_text_edit import SafeTextEdit
+from safe_text_edit import SafePlainTextEdit
+from worker import Worker
 
 
 class EmbedTab(QWidget):
@@ -23,6 +27,12 @@ class EmbedTab(QWidget):
         super().__init__()
         self.image_path = ""
         self.watermark_path = ""
+        self.keys = None
+        self.redundancy = 1  # Redundancy the shown keys were embedded with
+        # Embeds are queued and run one at a time off the GUI thread
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(1)
+        self.workers = []
         self._setup_ui()
 
     def _setup_ui(self):
@@ -56,11 +66,30 @@ class EmbedTab(QWidget):
         watermark_layout.addWidget(browse_watermark_btn)
         control_layout.addLayout(watermark_layout)
 
+        # Число копий каждого бита
+        redundancy_layout = QHBoxLayout()
+        redundancy_layout.addWidget(QLabel("Избыточность:"))
+        self.redundancy_spin = QSpinBox()
+        self.redundancy_spin.setRange(1, 64)
+        redundancy_layout.addWidget(self.redundancy_spin)
+        redundancy_layout.addStretch()
+        control_layout.addLayout(redundancy_layout)
+
         # Кнопка внедрения
         self.embed_button = QPushButton("Внедрить ЦВЗ")
         self.embed_button.clicked.connect(self.embed)
         control_layout.addWidget(self.embed_button)
 
+        # Прогресс и отмена фоновых задач
+        progress_layout = QHBoxLayout()
+        self.progress_bar = QProgressBar()
+        progress_layout.addWidget(self.progress_bar)
+        self.cancel_button = QPushButton("Отмена")
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_jobs)
+        progress_layout.addWidget(self.cancel_button)
+        control_layout.addLayout(progress_layout)
+
         left_layout.addWidget(control_frame)
 
         keys_frame = QWidget()
@@ -80,6 +109,10 @@ class EmbedTab(QWidget):
         copy_btn.clicked.connect(self.copy_to_clipboard)
         header_layout.addWidget(copy_btn)
 
+        save_keys_btn = QPushButton("Сохранить")
+        save_keys_btn.clicked.connect(self.save_keys)
+        header_layout.addWidget(save_keys_btn)
+
         # Добавляем растягивающий элемент между label и кнопкой
         header_layout.addStretch()
 
@@ -87,7 +120,7 @@ class EmbedTab(QWidget):
         keys_layout.addLayout(header_layout)
 
         # Создаем текстовое поле, которое займет все оставшееся пространство
-        self.keys_entry = SafeTextEdit()
+        self.keys_entry = SafePlainTextEdit()
         self.keys_entry.setReadOnly(True)
         keys_layout.addWidget(
             self.keys_entry, stretch=1
@@ -133,19 +166,50 @@ class EmbedTab(QWidget):
         if not save_path:
             return
 
-        try:
-            embedded_img, keys = digital_watermark.embed_watermark(
-                self.image_path, watermark_bytes
-            )
+        worker = Worker(
+            _embed_job,
+            self.image_path,
+            watermark_bytes,
+            self.redundancy_spin.value(),
+            save_path,
+        )
+        worker.signals.progress.connect(self.progress_bar.setValue)
+        worker.signals.finished.connect(
+            lambda result, worker=worker: self.on_embed_finished(worker, *result)
+        )
+        worker.signals.failed.connect(
+            lambda error, worker=worker: self.on_embed_failed(worker, error)
+        )
+        worker.signals.cancelled.connect(
+            lambda worker=worker: self._remove_worker(worker)
+        )
 
-            embedded_img.save(save_path)
+        self.workers.append(worker)
+        self.cancel_button.setEnabled(True)
+        self.thread_pool.start(worker)
 
-            keys_str = ",".join([f"{x},{y}" for x, y in keys])
-            self.keys_entry.set_large_text(keys_str)
+    def on_embed_finished(self, worker, keys, redundancy):
+        self._remove_worker(worker)
 
-            QMessageBox.information(self, "Успех", "Водяной знак успешно внедрен")
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Ошибка при внедрении:\n{str(e)}")
+        self.keys = keys
+        self.redundancy = redundancy
+        self.keys_entry.set_large_text(digital_watermark.format_key_text(keys))
+
+        QMessageBox.information(self, "Успех", "Водяной знак успешно внедрен")
+
+    def on_embed_failed(self, worker, error):
+        self._remove_worker(worker)
+        QMessageBox.critical(self, "Ошибка", f"Ошибка при внедрении:\n{error}")
+
+    def cancel_jobs(self):
+        for worker in self.workers:
+            worker.cancel()
+
+    def _remove_worker(self, worker):
+        self.workers.remove(worker)
+        if not self.workers:
+            self.progress_bar.reset()
+            self.cancel_button.setEnabled(False)
 
     def load_watermark_bytes(self):
         if os.path.exists(self.watermark_path):
@@ -173,12 +237,32 @@ class EmbedTab(QWidget):
 
     def display_image(self, path):
         try:
-            self.image_label.setPixmap(utils.load_image(path))
+            self.image_label.setPixmap(preview.load_image(path))
         except Exception as e:
             QMessageBox.critical(
                 self, "Ошибка", f"Не удалось загрузить изображение:\n{str(e)}"
             )
 
+    def save_keys(self):
+        if self.keys is None:
+            QMessageBox.warning(self, "Пусто", "Нет ключей для сохранения")
+            return
+
+        save_path, _ = QFileDialog.getSaveFileName(
+            self,
+            "Сохранить ключи",
+            "",
+            "Watermark keys (*.wmk);;All Files (*)",
+        )
+        if not save_path:
+            return
+
+        try:
+            digital_watermark.save_key(save_path, self.keys, redundancy=self.redundancy)
+            QMessageBox.information(self, "Успех", "Ключи сохранены")
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Ошибка при сохранении:\n{str(e)}")
+
     def copy_to_clipboard(self):
         text = self.keys_entry.toPlainText().replace("\n", "")
         if text:
@@ -186,3 +270,16 @@ class EmbedTab(QWidget):
             QMessageBox.information(self, "Скопировано", "Ключи скопированы в буфер")
         else:
             QMessageBox.warning(self, "Пусто", "Нет ключей для копирования")
+
+
+def _embed_job(report, image_path, watermark_bytes, redundancy, save_path):
+    report(0)
+    embedded_img, keys = digital_watermark.embed_watermark(
+        image_path, watermark_bytes, redundancy=redundancy
+    )
+
+    report(80)
+    embedded_img.save(save_path)
+
+    report(100)
+    return keys, redundancy
@@ -9,20 +9,28 @@ from PyQt6.QtWidgets import (
     QFileDialog,
     QMessageBox,
     QScrollArea,
+    QSpinBox,
+    QProgressBar,
 )
 from PyQt6.QtGui import QPixmap, QImage
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QThreadPool
 from PIL import Image
 
 import digital_watermark
-import utils
+import preview
 from image_label import ImageLabel
-from safe_text_edit import SafeTextEdit
+from safe_text_edit import SafePlainTextEdit, SafeTextEdit
+from worker import Worker
 
 
 class ExtractTab(QWidget):
     def __init__(self):
         super().__init__()
+        self.keys = None
+        # Extractions are queued and run one at a time off the GUI thread
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(1)
+        self.workers = []
         self._setup_ui()
 
     def _setup_ui(self):
@@ -49,15 +57,37 @@ class ExtractTab(QWidget):
         # Ключи
         keys_layout = QHBoxLayout()
         keys_layout.addWidget(QLabel("Ключи:"))
-        self.keys_entry = SafeTextEdit()
+        self.keys_entry = SafePlainTextEdit()
         keys_layout.addWidget(self.keys_entry)
+        load_keys_btn = QPushButton("Загрузить")
+        load_keys_btn.clicked.connect(self.load_keys)
+        keys_layout.addWidget(load_keys_btn)
         control_layout.addLayout(keys_layout)
 
+        # Число копий каждого бита
+        redundancy_layout = QHBoxLayout()
+        redundancy_layout.addWidget(QLabel("Избыточность:"))
+        self.redundancy_spin = QSpinBox()
+        self.redundancy_spin.setRange(1, 64)
+        redundancy_layout.addWidget(self.redundancy_spin)
+        redundancy_layout.addStretch()
+        control_layout.addLayout(redundancy_layout)
+
         # Кнопка извлечения
         self.extract_button = QPushButton("Извлечь ЦВЗ")
         self.extract_button.clicked.connect(self.extract)
         control_layout.addWidget(self.extract_button)
 
+        # Прогресс и отмена фоновых задач
+        progress_layout = QHBoxLayout()
+        self.progress_bar = QProgressBar()
+        progress_layout.addWidget(self.progress_bar)
+        self.cancel_button = QPushButton("Отмена")
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_jobs)
+        progress_layout.addWidget(self.cancel_button)
+        control_layout.addLayout(progress_layout)
+
         left_layout.addWidget(control_frame)
 
         # Результат (извлеченный текст)
@@ -96,36 +126,64 @@ class ExtractTab(QWidget):
             QMessageBox.critical(self, "Ошибка", "Выберите изображение")
             return
 
-        try:
-            keys_string = self.keys_entry.toPlainText().replace("\n", "")
-            if not keys_string:
-                QMessageBox.critical(self, "Ошибка", "Введите ключи")
-                return
-
-            numbers = list(map(int, keys_string.split(",")))
-
-            if len(numbers) % 2 != 0:
-                QMessageBox.critical(
-                    self,
-                    "Ошибка",
-                    "Неверный формат ключей. Ожидались пары чисел",
-                )
-                return
-
-            coord_pairs = list(zip(numbers[::2], numbers[1::2]))
-            extracted_bits = digital_watermark.extract_watermark(
-                image_path, coord_pairs
-            )
+        # Typed keys take precedence over a loaded key file
+        keys = self.keys_entry.toPlainText().replace("\n", "") or self.keys
+        if keys is None:
+            QMessageBox.critical(self, "Ошибка", "Введите ключи")
+            return
+
+        worker = Worker(_extract_job, image_path, keys, self.redundancy_spin.value())
+        worker.signals.progress.connect(self.progress_bar.setValue)
+        worker.signals.finished.connect(
+            lambda text, worker=worker: self.on_extract_finished(worker, text)
+        )
+        worker.signals.failed.connect(
+            lambda error, worker=worker: self.on_extract_failed(worker, error)
+        )
+        worker.signals.cancelled.connect(
+            lambda worker=worker: self._remove_worker(worker)
+        )
+
+        self.workers.append(worker)
+        self.cancel_button.setEnabled(True)
+        self.thread_pool.start(worker)
+
+    def on_extract_finished(self, worker, extracted_text):
+        self._remove_worker(worker)
+        self.extracted_text.set_large_text(extracted_text or "Текст не найден")
+
+    def on_extract_failed(self, worker, error):
+        self._remove_worker(worker)
+        QMessageBox.critical(self, "Ошибка", f"Ошибка при извлечении:\n{error}")
+
+    def cancel_jobs(self):
+        for worker in self.workers:
+            worker.cancel()
+
+    def _remove_worker(self, worker):
+        self.workers.remove(worker)
+        if not self.workers:
+            self.progress_bar.reset()
+            self.cancel_button.setEnabled(False)
 
-            bit_string = "".join(map(str, extracted_bits))
-            bytes_list = [
-                int(bit_string[i : i + 8], 2) for i in range(0, len(bit_string), 8)
-            ]
-            extracted_text = bytes(bytes_list).decode("utf-8", errors="replace")
+    def load_keys(self):
+        filepath, _ = QFileDialog.getOpenFileName(
+            self, "Выберите файл ключей", "", "Watermark keys (*.wmk);;All Files (*)"
+        )
+        if not filepath:
+            return
 
-            self.extracted_text.set_large_text(extracted_text or "Текст не найден")
+        try:
+            self.keys, redundancy = digital_watermark.load_key(filepath)
         except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Ошибка при извлечении:\n{str(e)}")
+            QMessageBox.critical(
+                self, "Ошибка", f"Не удалось загрузить ключи:\n{str(e)}"
+            )
+            return
+
+        self.redundancy_spin.setValue(redundancy)
+        self.keys_entry.clear()
+        self.keys_entry.setPlaceholderText(f"Ключи загружены из {filepath}")
 
     def browse_image(self):
         filepath, _ = QFileDialog.getOpenFileName(
@@ -137,8 +195,29 @@ class ExtractTab(QWidget):
 
     def display_image(self, path):
         try:
-            self.image_label.setPixmap(utils.load_image(path))
+            self.image_label.setPixmap(preview.load_image(path))
         except Exception as e:
             QMessageBox.critical(
                 self, "Ошибка", f"Не удалось загрузить изображение:\n{str(e)}"
             )
+
+
+def _extract_job(report, image_path, keys, redundancy):
+    report(0)
+    if isinstance(keys, str):
+        try:
+            keys = digital_watermark.parse_key_text(keys)
+        except ValueError:
+            raise ValueError("Неверный формат ключей. Ожидались пары чисел")
+
+    report(10)
+    extracted_bits = digital_watermark.extract_watermark(
+        image_path, keys, redundancy=redundancy
+    )
+
+    report(90)
+    bit_string = "".join(map(str, extracted_bits))
+    bytes_list = [int(bit_string[i : i + 8], 2) for i in range(0, len(bit_string), 8)]
+
+    report(100)
+    return bytes(bytes_list).decode("utf-8", errors="replace")
@@ -0,0 +1,77 @@
+from collections import OrderedDict
+import os
+import threading
+from typing import Optional
+from PIL import Image
+import numpy as np
+
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+
+class ImageCache:
+    # Decoded RGB arrays keyed by path, modification time and file size.
+    # Least recently used entries are evicted once the arrays take more than
+    # max_bytes. The arrays are shared, so they are returned read-only
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        # Used from the GUI thread and the worker threads
+        self._lock = threading.Lock()
+
+    def load_rgb(self, path: str) -> np.ndarray:
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            image_array = self._entries.get(key)
+            if image_array is not None:
+                self._entries.move_to_end(key)
+                return image_array
+
+        # Decode outside of the lock so other images are served meanwhile
+        with Image.open(path) as img:
+            image_array = np.array(img.convert("RGB"))
+        image_array.flags.writeable = False
+
+        with self._lock:
+            self._store(key, image_array)
+        return image_array
+
+    def peek_rgb(self, path: str) -> Optional[np.ndarray]:
+        # The cached array, without decoding the file when it is missing
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self._lock:
+            return self._entries.get((path, stat.st_mtime_ns, stat.st_size))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def _store(self, key, image_array: np.ndarray) -> None:
+        # Older versions of the same file are never requested again
+        for stale_key in [k for k in self._entries if k[0] == key[0]]:
+            self._total_bytes -= self._entries.pop(stale_key).nbytes
+
+        if image_array.nbytes > self.max_bytes:
+            return
+
+        self._entries[key] = image_array
+        self._total_bytes += image_array.nbytes
+        while self._total_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._total_bytes -= evicted.nbytes
+
+
+_cache = ImageCache()
+
+
+def load_rgb(path: str) -> np.ndarray:
+    return _cache.load_rgb(path)
+
+
+def peek_rgb(path: str) -> Optional[np.ndarray]:
+    return _cache.peek_rgb(path)
@@ -1,11 +1,17 @@
 import sys
 import os
+from pathlib import Path
 from PyQt6.QtWidgets import (
     QApplication,
     QMainWindow,
     QTabWidget,
 )
 
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+
 from embed_tab import EmbedTab
 from extract_tab import ExtractTab
 
@@ -0,0 +1,43 @@
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class WorkerSignals(QObject):
+    progress = pyqtSignal(int)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+
+class Worker(QRunnable):
+    # Runs job(report, *args) on a QThreadPool thread. The job calls
+    # report(percent) between its stages, and after cancel() the next call
+    # raises JobCancelled, so a queued job is dropped before it starts
+    def __init__(self, job, *args):
+        super().__init__()
+        self.job = job
+        self.args = args
+        # Created on the GUI thread, so connected slots run there as well
+        self.signals = WorkerSignals()
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def report(self, percent):
+        if self._cancelled:
+            raise JobCancelled()
+        self.signals.progress.emit(percent)
+
+    def run(self):
+        try:
+            result = self.job(self.report, *self.args)
+        except JobCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+        else:
+            self.signals.finished.emit(result)
@@ -6,6 +6,7 @@ import numpy as np
 from PIL import Image
 
 import rdh
+import tiled
 
 ROOT_DIR = Path(__file__).resolve().parent.parent
 
@@ -21,33 +22,52 @@ def main():
     parser.add_argument("-m", "--message", required=True, help="Message file")
     parser.add_argument("-i", "--input", required=True, help="Input BMP image")
     parser.add_argument("-o", "--output", required=True, help="Output stego image")
+    parser.add_argument("-e", "--extracted", help="Write the extracted message here")
+    parser.add_argument(
+        "-k",
+        type=int,
+        default=4,
+        choices=range(1, rdh.MAX_K + 1),
+        help="Bits per symbol",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=1,
+        help="Worker processes, more than 1 enables the tiled pipeline",
+    )
 
     args = parser.parse_args()
 
-    message = open(args.message, "r", encoding="utf-8").read()
-    secret_binary = rdh.text_to_bits(message)
+    # Any binary payload, not only UTF-8 text
+    message = np.fromfile(args.message, dtype=np.uint8)
 
     input_img = Image.open(args.input).convert("L")
 
     full_img = np.array(input_img)
-    small_img = rdh.downscale_image(full_img)
-    cover_img = rdh.upscale_inp(small_img)
-
-    stego_img, embedded_bits = rdh.embed_secret(cover_img, secret_binary)
+    if args.workers > 1:
+        cover_img, stego_img, embedded_bytes = tiled.embed_bytes_tiled(
+            full_img, message, args.k, workers=args.workers
+        )
+    else:
+        small_img = rdh.downscale_image(full_img)
+        cover_img = rdh.upscale_inp(small_img)
+        stego_img, embedded_bytes = rdh.embed_bytes(cover_img, message, args.k)
     rdh.save_image(stego_img, args.output)
 
-    recovered_bits = rdh.extract_secret(
-        stego_img, cover_img.astype(np.uint8), embedded_bits
-    )
-    output_text = rdh.bits_to_text(recovered_bits)
+    recovered = rdh.extract_bytes(stego_img, cover_img.astype(np.uint8))
+    if args.extracted:
+        with open(args.extracted, "wb") as f:
+            f.write(recovered)
 
     psnr_val = stego.psnr(cover_img, stego_img, input_img.mode)
-    capacity = embedded_bits / (full_img.shape[0] * full_img.shape[1])
+    capacity = embedded_bytes * 8 / (full_img.shape[0] * full_img.shape[1])
 
-    print(f"Embed bits: {embedded_bits/8}")
+    print(f"Embed bytes: {embedded_bytes}")
     print(f"Capacity (bit/pixel): {capacity:.4f}")
     print(f"PSNR: {psnr_val:.2f} dB")
-    # print(f"Извлечённый текст: {output_text}")
+    print(f"Extracted: {'ok' if recovered == message.tobytes() else 'mismatch'}")
 
 
 if __name__ == "__main__":
@@ -1,6 +1,26 @@
 import numpy as np
 from PIL import Image
 
+# Pixels that carry the codes inside a 4x4 block and the one carrying the index
+BLOCK_POSITIONS = [(0, 1), (1, 0), (1, 2), (2, 1)]
+BLOCK_CENTER = (2, 2)
+INDEX_WEIGHTS = 1 << np.arange(len(BLOCK_POSITIONS) - 1, -1, -1)
+MAX_INDEX = (1 << len(BLOCK_POSITIONS)) - 1
+# The center carries I - INDEX_SHIFT, in -16..-1 whatever k is
+INDEX_SHIFT = MAX_INDEX + 1
+# Big-endian header in front of the bytes payload: (k - 4) mod 8 in the top
+# three bits, then the payload length. The default k = 4 thus writes the plain
+# length header of the original format. The header is always embedded with
+# k = 4 in the first blocks, so extraction learns k before reading the payload
+LENGTH_BYTES = 4
+LENGTH_BITS = LENGTH_BYTES * 8
+HEADER_K = 4
+HEADER_BLOCKS = LENGTH_BITS // (4 * HEADER_K)
+MAX_K = 6  # Codes go down to -2^(k - 1), larger k clip most pixels
+K_BITS = 3
+K_SHIFT = LENGTH_BITS - K_BITS
+MAX_PAYLOAD_LENGTH = (1 << K_SHIFT) - 1
+
 
 def text_to_bits(text, encoding="utf-8") -> str:
     return "".join(format(byte, "08b") for byte in text.encode(encoding))
@@ -31,123 +51,182 @@ def upscale_inp(original):
     new_h, new_w = h * 2 - 1, w * 2 - 1
     result = np.zeros((new_h, new_w), dtype=np.uint8)
 
-    for i in range(h):
-        for j in range(w):
-            result[2 * i, 2 * j] = original[i, j]
-
-    for i in range(0, new_h, 2):
-        for j in range(1, new_w, 2):
-            left = result[i, j - 1]
-            right = result[i, j + 1] if j + 1 < new_w else left
-            result[i, j] = (int(left) + int(right)) // 2
-
-    for i in range(1, new_h, 2):
-        for j in range(0, new_w, 2):
-            top = result[i - 1, j]
-            bottom = result[i + 1, j] if i + 1 < new_h else top
-            result[i, j] = (int(top) + int(bottom)) // 2
-
-    for i in range(1, new_h, 2):
-        for j in range(1, new_w, 2):
-            tl = result[i - 1, j - 1]
-            tr = result[i - 1, j + 1] if j + 1 < new_w else tl
-            bl = result[i + 1, j - 1] if i + 1 < new_h else tl
-            br = result[i + 1, j + 1] if (i + 1 < new_h and j + 1 < new_w) else tl
-            result[i, j] = (int(tl) + int(tr) + int(bl) + int(br)) // 4
+    # Original pixels go to the even rows and columns, the rest is the floor
+    # of the mean of the two (edges) or four (centers) nearest originals
+    pixels = original.astype(np.int16)
+    result[::2, ::2] = original
+    result[::2, 1::2] = (pixels[:, :-1] + pixels[:, 1:]) // 2
+    result[1::2, ::2] = (pixels[:-1, :] + pixels[1:, :]) // 2
+    result[1::2, 1::2] = (
+        pixels[:-1, :-1] + pixels[:-1, 1:] + pixels[1:, :-1] + pixels[1:, 1:]
+    ) // 4
 
     return result
 
 
 def get_code_and_index(d, k):
     M = 2 ** (k - 1)
-    if d < M:
-        return 0, d - M  # center
-    else:
-        return 1, d - M - (2 ** (k - 1))  # shifted for index 1
+    # Works element-wise on symbol arrays: index 0 is centered, 1 is shifted
+    index = np.where(d < M, 0, 1)
+    return index, d - M - index * (2 ** (k - 1))
 
 
 def get_symbol_from_code(index, code, k):
     M = 2 ** (k - 1)
-    if index == 0:
-        return code + M
-    else:
-        return code + M + (2 ** (k - 1))
-
-
-def embed_secret(cover, secret_bits, k=4):
-    h, w = cover.shape
-    stego = cover.copy().astype(np.int16)
-    i = 0
-    embedded_bits = 0
-
-    for y in range(0, h - 2, 4):
-        for x in range(0, w - 2, 4):
-            if i + 4 * k > len(secret_bits):
-                return np.clip(stego, 0, 255).astype(np.uint8), embedded_bits
-
-            symbols = []
-            for j in range(4):
-                start = i + j * k
-                end = i + (j + 1) * k
-                if end > len(secret_bits):
-                    bits = secret_bits[start:] + "0" * (end - len(secret_bits))
-                    symbols.append(int(bits, 2))
-                    embedded_bits += len(secret_bits[start:])
-                    i = len(secret_bits)
-                    break
-                else:
-                    bits = secret_bits[start:end]
-                    symbols.append(int(bits, 2))
-                    embedded_bits += k
-            else:
-                i += 4 * k
-
-            codes = []
-            indexes = []
-            for s in symbols:
-                index, code = get_code_and_index(s, k)
-                codes.append(code)
-                indexes.append(index)
-
-            index_bin = "".join(map(str, indexes))
-            I = int(index_bin, 2)
-            M = 2**k
-            Pc = int(cover[y + 2, x + 2])
-            stego[y + 2, x + 2] = Pc + (I - M)
-
-            positions = [(y, x + 1), (y + 1, x), (y + 1, x + 2), (y + 2, x + 1)]
-            for pos, code in zip(positions, codes):
-                stego[pos] += code
-
-    return np.clip(stego, 0, 255).astype(np.uint8), embedded_bits
-
-
-def extract_secret(stego, cover, total_bits, k=4):
-    h, w = stego.shape
-    recovered_bits = []
-    count = 0
-
-    for y in range(0, h - 2, 4):
-        for x in range(0, w - 2, 4):
-            if count >= total_bits:
-                break
-
-            positions = [(y, x + 1), (y + 1, x), (y + 1, x + 2), (y + 2, x + 1)]
-            codes = [int(stego[pos]) - int(cover[pos]) for pos in positions]
-
-            Pc = int(cover[y + 2, x + 2])
-            Pc_ = int(stego[y + 2, x + 2])
-            I = Pc_ - Pc + 2**k
-            I = max(0, min(15, I))
-            index_bin = format(I, f"0{4}b")[-4:]
-            indexes = list(map(int, index_bin))
-
-            for idx, code in zip(indexes, codes):
-                if count >= total_bits:
-                    break
-                s = get_symbol_from_code(idx, code, k)
-                s = max(0, min(2**k - 1, s))
-                recovered_bits.append(format(s, f"0{k}b"))
-                count += k
-
-    return "".join(recovered_bits)[:total_bits]
+    return code + M + index * (2 ** (k - 1))
+
+
+def embed_secret(cover, secret_bits, k=4, first_block=0):
+    bits = _as_bit_array(secret_bits)
+    rows, cols = block_grid(cover.shape)
+
+    # Only whole blocks of 4k bits are embedded, starting at first_block in
+    # row-major block order
+    n_blocks = max(0, min(rows * cols - first_block, bits.size // (4 * k)))
+    weights = 1 << np.arange(k - 1, -1, -1)
+    symbols = bits[: n_blocks * 4 * k].reshape(n_blocks, 4, k) @ weights
+
+    indexes, codes = get_code_and_index(symbols, k)
+    I = indexes @ INDEX_WEIGHTS
+
+    # Blocks outside the payload keep zero offsets
+    offsets = np.zeros((rows * cols, 5), dtype=np.int16)
+    offsets[first_block : first_block + n_blocks, :4] = codes
+    offsets[first_block : first_block + n_blocks, 4] = I - INDEX_SHIFT
+    offsets = offsets.reshape(rows, cols, 5)
+
+    stego = cover.astype(np.int16)
+    for n, (dy, dx) in enumerate(BLOCK_POSITIONS + [BLOCK_CENTER]):
+        _block_view(stego, dy, dx, rows, cols)[...] += offsets[..., n]
+
+    return np.clip(stego, 0, 255).astype(np.uint8), n_blocks * 4 * k
+
+
+def extract_secret(stego, cover, total_bits, k=4, first_block=0) -> bytes:
+    rows, cols = block_grid(stego.shape)
+    n_blocks = max(0, min(rows * cols - first_block, -(-total_bits // (4 * k))))
+    last_block = first_block + n_blocks
+    block_rows = -(-last_block // cols) if n_blocks else 0
+
+    def gather(array, dy, dx):
+        view = _block_view(array, dy, dx, block_rows, cols)
+        return view.astype(np.int16).reshape(-1)[first_block:last_block]
+
+    codes = np.stack(
+        [gather(stego, dy, dx) - gather(cover, dy, dx) for dy, dx in BLOCK_POSITIONS],
+        axis=1,
+    )
+
+    I = gather(stego, *BLOCK_CENTER) - gather(cover, *BLOCK_CENTER) + INDEX_SHIFT
+    I = np.clip(I, 0, MAX_INDEX)
+    indexes = (I[:, None] & INDEX_WEIGHTS) != 0
+
+    symbols = np.clip(get_symbol_from_code(indexes, codes, k), 0, 2**k - 1)
+    bits = (symbols[..., None] >> np.arange(k - 1, -1, -1)) & 1
+    bits = bits.reshape(-1)[:total_bits]
+
+    # A trailing incomplete byte is dropped
+    return np.packbits(bits[: bits.size // 8 * 8].astype(np.uint8)).tobytes()
+
+
+def capacity_bits(shape, k=4):
+    rows, cols = block_grid(shape)
+    return rows * cols * 4 * k
+
+
+def capacity_bytes(shape, k=4):
+    # Payload bytes that embed_bytes fits after the header blocks
+    rows, cols = block_grid(shape)
+    payload_bits = (rows * cols - HEADER_BLOCKS) * 4 * k
+    return min(MAX_PAYLOAD_LENGTH, max(0, payload_bits // 8))
+
+
+def embed_bytes(cover, payload, k=4):
+    rows, cols = block_grid(cover.shape)
+    segments = payload_segments(payload, k, rows * cols)
+    return embed_segments(cover, segments), len(payload)
+
+
+def payload_segments(payload, k=4, capacity_blocks=None):
+    # (first block, bits, k) runs: the header with HEADER_K, then the payload
+    # with k, zero-padded to whole blocks since embed_secret drops the rest
+    if not 1 <= k <= MAX_K:
+        raise ValueError(f"k must be between 1 and {MAX_K}")
+
+    payload = _as_byte_array(payload)
+    if payload.size > MAX_PAYLOAD_LENGTH:
+        raise ValueError("The message is too big to fit in the image")
+
+    header = (k - HEADER_K) % (1 << K_BITS) << K_SHIFT | payload.size
+    header_bits = np.unpackbits(
+        np.frombuffer(header.to_bytes(LENGTH_BYTES, byteorder="big"), dtype=np.uint8)
+    )
+
+    bits = np.unpackbits(payload)
+    block_bits = 4 * k
+    padded = np.zeros(-(-bits.size // block_bits) * block_bits, dtype=np.uint8)
+    padded[: bits.size] = bits
+
+    blocks = HEADER_BLOCKS + padded.size // block_bits
+    if capacity_blocks is not None and blocks > capacity_blocks:
+        raise ValueError("The message is too big to fit in the image")
+
+    return [(0, header_bits, HEADER_K), (HEADER_BLOCKS, padded, k)]
+
+
+def slice_segments(segments, first_block, block_count):
+    # The parts of the segments that fall into blocks
+    # first_block..first_block+block_count-1, renumbered from first_block
+    sliced = []
+    for start, bits, k in segments:
+        block_bits = 4 * k
+        low = max(start, first_block)
+        high = min(start + bits.size // block_bits, first_block + block_count)
+        if low < high:
+            part = bits[(low - start) * block_bits : (high - start) * block_bits]
+            sliced.append((low - first_block, part, k))
+    return sliced
+
+
+def embed_segments(cover, segments):
+    stego = cover.astype(np.uint8)
+    for start, bits, k in segments:
+        stego, _ = embed_secret(stego, bits, k, first_block=start)
+    return stego
+
+
+def extract_bytes(stego, cover) -> bytes:
+    header = extract_secret(stego, cover, LENGTH_BITS, HEADER_K)
+    if len(header) < LENGTH_BYTES:
+        raise ValueError("The image is too small to contain a message")
+
+    header = int.from_bytes(header, byteorder="big")
+    k = ((header >> K_SHIFT) + HEADER_K - 1) % (1 << K_BITS) + 1
+    length = header & MAX_PAYLOAD_LENGTH
+    if length > capacity_bytes(stego.shape, k):
+        raise ValueError("Message length exceeds the image capacity")
+
+    return extract_secret(stego, cover, length * 8, k, first_block=HEADER_BLOCKS)
+
+
+def _as_byte_array(payload):
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        return np.frombuffer(payload, dtype=np.uint8)
+    return np.asarray(payload, dtype=np.uint8).reshape(-1)
+
+
+def _as_bit_array(bits):
+    if isinstance(bits, str):
+        return np.frombuffer(bits.encode("ascii"), dtype=np.uint8) - ord("0")
+    return np.asarray(bits, dtype=np.uint8)
+
+
+def block_grid(shape):
+    # Blocks start every 4 pixels while their center (y + 2, x + 2) fits
+    h, w = shape
+    return len(range(0, h - 2, 4)), len(range(0, w - 2, 4))
+
+
+def _block_view(array, dy, dx, rows, cols):
+    # Pixel (y + dy, x + dx) of every block as a (rows, cols) strided view
+    return array[dy : dy + 4 * rows : 4, dx : dx + 4 * cols : 4]
@@ -0,0 +1,146 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import os
+from pathlib import Path
+import sys
+import numpy as np
+from PIL import Image
+
+import rdh
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+
+import utils.stego as stego
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Capacity and PSNR of RDH embedding for several k"
+    )
+    parser.add_argument("-i", "--input", required=True, help="Input BMP image")
+    parser.add_argument(
+        "-m",
+        "--message",
+        help="Message file (defaults to random bytes filling the capacity)",
+    )
+    parser.add_argument(
+        "-t",
+        "--target-psnr",
+        type=float,
+        default=40.0,
+        help="Lowest acceptable PSNR, dB",
+    )
+    parser.add_argument(
+        "-e",
+        "--max-ber",
+        type=float,
+        default=0.001,
+        help="Highest acceptable bit error rate of the extracted payload",
+    )
+    parser.add_argument(
+        "-k",
+        type=int,
+        nargs="+",
+        default=list(range(1, rdh.MAX_K + 1)),
+        choices=range(1, rdh.MAX_K + 1),
+        help="k values to try",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of worker processes",
+    )
+
+    args = parser.parse_args()
+
+    full_img = np.array(Image.open(args.input).convert("L"))
+    cover_img = rdh.upscale_inp(rdh.downscale_image(full_img))
+    message = np.fromfile(args.message, dtype=np.uint8) if args.message else None
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        results = list(
+            executor.map(partial(evaluate_k, cover_img, message), sorted(args.k))
+        )
+
+    pixels = full_img.shape[0] * full_img.shape[1]
+    print(
+        f"{'k':>3} {'capacity, B':>12} {'bit/pixel':>10} {'PSNR, dB':>10} {'BER':>10}"
+    )
+    for result in results:
+        fits = result["psnr"] is not None
+        psnr = f"{result['psnr']:.2f}" if fits else "-"
+        ber = f"{result['ber']:.6f}" if fits else "-"
+        print(
+            f"{result['k']:>3} {result['capacity']:>12} "
+            f"{result['capacity'] * 8 / pixels:>10.4f} {psnr:>10} {ber:>10}"
+        )
+
+    best = pick_best(
+        results, args.target_psnr, args.max_ber, fixed_payload=message is not None
+    )
+    if best is None:
+        print(
+            f"No k reaches {args.target_psnr:.2f} dB "
+            f"with a bit error rate <= {args.max_ber}"
+        )
+    else:
+        print(
+            f"Best k for PSNR >= {args.target_psnr:.2f} dB "
+            f"and bit error rate <= {args.max_ber}: {best['k']}"
+        )
+
+
+def evaluate_k(cover_img, message, k):
+    capacity = rdh.capacity_bytes(cover_img.shape, k)
+    result = {"k": k, "capacity": capacity, "psnr": None, "ber": None}
+
+    if message is None:
+        rng = np.random.default_rng(k)
+        message = rng.integers(0, 256, capacity, dtype=np.uint8)
+    if message.size > capacity:
+        return result
+
+    rows, cols = rdh.block_grid(cover_img.shape)
+    segments = rdh.payload_segments(message, k, rows * cols)
+    stego_img = rdh.embed_segments(cover_img, segments)
+    result["psnr"] = stego.psnr(cover_img, stego_img, "L")
+
+    # Pixels pushed out of range are clipped and lose their bits, so count
+    # the errors of the header and the payload read back with known k
+    errors = total = 0
+    for start, bits, segment_k in segments:
+        extracted = rdh.extract_secret(
+            stego_img, cover_img, bits.size, segment_k, first_block=start
+        )
+        extracted_bits = np.unpackbits(np.frombuffer(extracted, dtype=np.uint8))
+        errors += np.count_nonzero(extracted_bits != bits[: extracted_bits.size])
+        total += extracted_bits.size
+    result["ber"] = errors / total if total else 0.0
+
+    return result
+
+
+def pick_best(results, target_psnr, max_ber, fixed_payload=False):
+    candidates = [
+        result
+        for result in results
+        if result["psnr"] is not None
+        and result["psnr"] >= target_psnr
+        and result["ber"] <= max_ber
+    ]
+    if not candidates:
+        return None
+
+    # The most capacity, or with a given message the least distortion
+    key = "psnr" if fixed_payload else "capacity"
+    return max(candidates, key=lambda result: (result[key], result["psnr"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+from pathlib import Path
+import numpy as np
+import pytest
+
+import rdh
+
+IMAGES_DIR = Path(__file__).resolve().parent.parent.parent / "images"
+
+
+def upscale_inp_reference(original):
+    # The original loop implementation, kept as the reference
+    h, w = original.shape
+    new_h, new_w = h * 2 - 1, w * 2 - 1
+    result = np.zeros((new_h, new_w), dtype=np.uint8)
+
+    for i in range(h):
+        for j in range(w):
+            result[2 * i, 2 * j] = original[i, j]
+
+    for i in range(0, new_h, 2):
+        for j in range(1, new_w, 2):
+            left = result[i, j - 1]
+            right = result[i, j + 1] if j + 1 < new_w else left
+            result[i, j] = (int(left) + int(right)) // 2
+
+    for i in range(1, new_h, 2):
+        for j in range(0, new_w, 2):
+            top = result[i - 1, j]
+            bottom = result[i + 1, j] if i + 1 < new_h else top
+            result[i, j] = (int(top) + int(bottom)) // 2
+
+    for i in range(1, new_h, 2):
+        for j in range(1, new_w, 2):
+            tl = result[i - 1, j - 1]
+            tr = result[i - 1, j + 1] if j + 1 < new_w else tl
+            bl = result[i + 1, j - 1] if i + 1 < new_h else tl
+            br = result[i + 1, j + 1] if (i + 1 < new_h and j + 1 < new_w) else tl
+            result[i, j] = (int(tl) + int(tr) + int(bl) + int(br)) // 4
+
+    return result
+
+
+@pytest.mark.parametrize(
+    "shape", [(1, 1), (1, 7), (7, 1), (2, 2), (4, 6), (5, 9), (301, 402)]
+)
+def test_upscale_inp_matches_reference(shape):
+    rng = np.random.default_rng(sum(shape))
+    original = rng.integers(0, 256, shape, dtype=np.uint8)
+
+    result = rdh.upscale_inp(original)
+    expected = upscale_inp_reference(original)
+
+    assert result.dtype == expected.dtype
+    assert np.array_equal(result, expected)
+
+
+def test_upscale_inp_extremes():
+    # Sums of 255s must not overflow
+    original = np.array([[255, 0, 255], [255, 255, 0]], dtype=np.uint8)
+    assert np.array_equal(rdh.upscale_inp(original), upscale_inp_reference(original))
+
+
+@pytest.mark.parametrize("k", range(1, rdh.MAX_K + 1))
+def test_bytes_round_trip(k):
+    full_img = rdh.load_image(IMAGES_DIR / "1.bmp")
+    cover = rdh.upscale_inp(rdh.downscale_image(full_img))
+
+    # Saturated pixels, and the darkest ones the codes and the index can
+    # still be subtracted from without clipping
+    cover[:64, :64] = 255
+    cover[64:128, :64] = max(rdh.INDEX_SHIFT, 2 ** (k - 1))
+
+    rng = np.random.default_rng(k)
+    payload = rng.integers(0, 256, rdh.capacity_bytes(cover.shape, k), dtype=np.uint8)
+
+    stego, _ = rdh.embed_bytes(cover, payload, k)
+    assert rdh.extract_bytes(stego, cover) == payload.tobytes()
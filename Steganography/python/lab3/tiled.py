@@ -0,0 +1,88 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import os
+import numpy as np
+
+import rdh
+
+MIN_STRIP_BLOCK_ROWS = 16
+STRIPS_PER_WORKER = 4  # Several strips per worker even out uneven progress
+
+
+def embed_bytes_tiled(full_img, payload, k=4, workers=None, strip_block_rows=None):
+    # downscale -> upscale_inp -> embed in horizontal strips of block rows on
+    # a process pool. Block row r covers cover rows 4r..4r+2 and is built from
+    # small rows 2r and 2r+1 only, so strips are independent once every strip
+    # knows its payload offset. Returns the cover, the stego and the number of
+    # embedded bytes; the result matches rdh.embed_bytes on the whole image
+    workers = workers or os.cpu_count()
+    small_img = np.ascontiguousarray(rdh.downscale_image(full_img), dtype=np.uint8)
+    small_h, small_w = small_img.shape
+    cover_shape = (2 * small_h - 1, 2 * small_w - 1)
+
+    rows, cols = rdh.block_grid(cover_shape)
+    segments = rdh.payload_segments(payload, k, rows * cols)
+
+    if strip_block_rows is None:
+        strip_block_rows = max(
+            MIN_STRIP_BLOCK_ROWS, -(-rows // (workers * STRIPS_PER_WORKER))
+        )
+    # The last strip also takes the rows below the last block row
+    bounds = list(range(0, rows, strip_block_rows)) + [rows]
+
+    buffers = [
+        shared_memory.SharedMemory(create=True, size=max(1, small_img.nbytes)),
+        shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(cover_shape)))),
+        shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(cover_shape)))),
+    ]
+    try:
+        small_shared, cover_shared, stego_shared = buffers
+        np.ndarray(small_img.shape, np.uint8, small_shared.buf)[...] = small_img
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(
+                    _embed_strip,
+                    [buffer.name for buffer in buffers],
+                    small_img.shape,
+                    start,
+                    stop,
+                    stop == bounds[-1],
+                    rdh.slice_segments(segments, start * cols, (stop - start) * cols),
+                )
+                for start, stop in zip(bounds[:-1], bounds[1:])
+            ]
+            for future in futures:
+                future.result()
+
+        cover = np.ndarray(cover_shape, np.uint8, cover_shared.buf).copy()
+        stego = np.ndarray(cover_shape, np.uint8, stego_shared.buf).copy()
+    finally:
+        for buffer in buffers:
+            buffer.close()
+            buffer.unlink()
+
+    return cover, stego, len(payload)
+
+
+def _embed_strip(names, small_shape, start, stop, last, segments):
+    buffers = [shared_memory.SharedMemory(name=name) for name in names]
+    try:
+        small_h, small_w = small_shape
+        cover_shape = (2 * small_h - 1, 2 * small_w - 1)
+        small_img = np.ndarray(small_shape, np.uint8, buffers[0].buf)
+        cover = np.ndarray(cover_shape, np.uint8, buffers[1].buf)
+        stego = np.ndarray(cover_shape, np.uint8, buffers[2].buf)
+
+        # One extra small row gives the odd cover row between two strips
+        small_stop = small_h if last else min(small_h, 2 * stop + 1)
+        strip_cover = rdh.upscale_inp(small_img[2 * start : small_stop])
+        cover_stop = cover_shape[0] if last else 4 * stop
+        strip_cover = strip_cover[: cover_stop - 4 * start]
+
+        strip_stego = rdh.embed_segments(strip_cover, segments)
+        cover[4 * start : cover_stop] = strip_cover
+        stego[4 * start : cover_stop] = strip_stego
+    finally:
+        for buffer in buffers:
+            buffer.close()
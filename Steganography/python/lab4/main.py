@@ -0,0 +1,111 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import json
+import os
+from pathlib import Path
+import sys
+import time
+from PIL import Image
+import numpy as np
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+
+import utils.steganalysis as steganalysis
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Chi-square and RS steganalysis of BMP images"
+    )
+    parser.add_argument("input", help="BMP image or directory with BMP images")
+    parser.add_argument(
+        "-p", "--pattern", default="*.bmp", help="File pattern inside the directory"
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of worker processes",
+    )
+    parser.add_argument(
+        "-r", "--results", help="Output JSON lines file (defaults to stdout)"
+    )
+
+    args = parser.parse_args()
+
+    input_path = Path(args.input)
+    if input_path.is_dir():
+        paths = sorted(str(path) for path in input_path.glob(args.pattern))
+    else:
+        paths = [str(input_path)]
+
+    results_file = (
+        open(args.results, "w", encoding="utf-8") if args.results else sys.stdout
+    )
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = {executor.submit(analyze_entry, path): path for path in paths}
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # The worker process itself died
+                    result = _error_result(futures[future], e)
+
+                results_file.write(json.dumps(result) + "\n")
+                results_file.flush()
+    finally:
+        if results_file is not sys.stdout:
+            results_file.close()
+
+
+def analyze_entry(path):
+    start = time.perf_counter()
+    try:
+        result = analyze_file(path)
+    except Exception as e:
+        return _error_result(path, e, start)
+
+    return {
+        "image": path,
+        "status": "ok",
+        **result,
+        "time": time.perf_counter() - start,
+    }
+
+
+def analyze_file(path):
+    img = Image.open(path)
+    if img.mode not in ("P", "L", "RGB"):
+        raise ValueError(
+            "Only 24-bit, 8-bit indexed or grayscale BMP images are supported."
+        )
+
+    # For indexed images the palette indices carry the LSBs
+    image_array = np.array(img)
+
+    p_values, chi_square_rate = steganalysis.chi_square_attack(image_array)
+
+    return {
+        "chi_square_p": float(p_values[-1]),
+        "chi_square_rate": chi_square_rate,
+        # null when RS analysis cannot estimate the rate for this image
+        "rs_rate": steganalysis.rs_analysis(image_array),
+    }
+
+
+def _error_result(path, error, start=None):
+    return {
+        "image": path,
+        "status": "error",
+        "error": f"{type(error).__name__}: {error}",
+        "time": time.perf_counter() - start if start is not None else None,
+    }
+
+
+if __name__ == "__main__":
+    main()
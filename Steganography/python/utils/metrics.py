@@ -0,0 +1,126 @@
+from typing import List, Sequence
+import numpy as np
+
+from utils.stego import MAX_PIXEL, mse, psnr_from_mse, sum_squared_error
+
+SSIM_WINDOW = 7
+SSIM_K1 = 0.01
+SSIM_K2 = 0.03
+LUMA_WEIGHTS = (0.299, 0.587, 0.114)
+HISTOGRAM_BINS = 256
+
+
+def psnr(original: np.ndarray, distorted: np.ndarray) -> float:
+    return psnr_from_mse(mse(original, distorted))
+
+
+def psnr_per_channel(original: np.ndarray, distorted: np.ndarray) -> List[float]:
+    _check_shapes(original, distorted)
+
+    return [
+        psnr_from_mse(sum_squared_error(o, d) / o.size)
+        for o, d in zip(_channels(original), _channels(distorted))
+    ]
+
+
+def weighted_psnr(
+    original: np.ndarray,
+    distorted: np.ndarray,
+    weights: Sequence[float] = LUMA_WEIGHTS,
+) -> float:
+    # PSNR of the weighted mean of per-channel MSEs, by default weighted by
+    # the contribution of each RGB channel to luminance
+    _check_shapes(original, distorted)
+
+    channels = list(zip(_channels(original), _channels(distorted)))
+    if len(weights) != len(channels):
+        raise ValueError("Expected one weight per channel")
+
+    weighted_mse = sum(
+        weight * sum_squared_error(o, d) / o.size
+        for weight, (o, d) in zip(weights, channels)
+    )
+    return psnr_from_mse(weighted_mse / sum(weights))
+
+
+def ssim(
+    original: np.ndarray, distorted: np.ndarray, window: int = SSIM_WINDOW
+) -> float:
+    # Mean SSIM over all channels with a uniform window. Local sums come from a
+    # separable box filter in exact integer arithmetic; the statistics are
+    # expressed through window sums, so no float image copies are needed
+    # until the final ratio
+    _check_shapes(original, distorted)
+
+    if min(original.shape[:2]) < window:
+        raise ValueError("Image is smaller than the SSIM window")
+
+    n = window * window
+    c1 = (SSIM_K1 * MAX_PIXEL) ** 2 * n * n
+    c2 = (SSIM_K2 * MAX_PIXEL) ** 2 * n * n
+
+    channel_means = []
+    for o, d in zip(_channels(original), _channels(distorted)):
+        x = o.astype(np.int32)
+        y = d.astype(np.int32)
+
+        sum_x = _box_sum(x, window).astype(np.float64)
+        sum_y = _box_sum(y, window).astype(np.float64)
+        sum_xx = _box_sum(x * x, window).astype(np.float64)
+        sum_yy = _box_sum(y * y, window).astype(np.float64)
+        sum_xy = _box_sum(x * y, window).astype(np.float64)
+
+        # Same as ((2*mu_x*mu_y + C1) * (2*cov_xy + C2)) /
+        # ((mu_x^2 + mu_y^2 + C1) * (var_x + var_y + C2)) scaled by n^4
+        numerator = (2 * sum_x * sum_y + c1) * (2 * (n * sum_xy - sum_x * sum_y) + c2)
+        denominator = (sum_x * sum_x + sum_y * sum_y + c1) * (
+            n * sum_xx - sum_x * sum_x + n * sum_yy - sum_y * sum_y + c2
+        )
+        channel_means.append(float(np.mean(numerator / denominator)))
+
+    return sum(channel_means) / len(channel_means)
+
+
+def histogram_chi_square(original: np.ndarray, distorted: np.ndarray) -> float:
+    # Symmetric chi-square distance between the per-channel histograms,
+    # summed over channels
+    _check_shapes(original, distorted)
+
+    distance = 0.0
+    for o, d in zip(_channels(original), _channels(distorted)):
+        hist_o = np.bincount(o.reshape(-1), minlength=HISTOGRAM_BINS)
+        hist_d = np.bincount(d.reshape(-1), minlength=HISTOGRAM_BINS)
+
+        total = hist_o + hist_d
+        nonzero = total > 0
+        diff = (hist_o - hist_d)[nonzero]
+        distance += float(np.sum(diff * diff / total[nonzero]))
+
+    return distance
+
+
+def _box_sum(values: np.ndarray, window: int) -> np.ndarray:
+    # Sum over every window x window block ("valid" positions only), computed
+    # as a vertical then a horizontal running sum of shifted slices
+    height = values.shape[0] - window + 1
+    rows = values[:height].copy()
+    for k in range(1, window):
+        rows += values[k : k + height]
+
+    width = values.shape[1] - window + 1
+    sums = rows[:, :width].copy()
+    for k in range(1, window):
+        sums += rows[:, k : k + width]
+
+    return sums
+
+
+def _channels(image: np.ndarray) -> List[np.ndarray]:
+    if image.ndim == 2:
+        return [image]
+    return [image[..., c] for c in range(image.shape[2])]
+
+
+def _check_shapes(original: np.ndarray, distorted: np.ndarray) -> None:
+    if original.shape != distorted.shape:
+        raise ValueError("Images must be the same size")
@@ -0,0 +1,62 @@
+import hashlib
+import numpy as np
+
+FEISTEL_ROUNDS = 4
+# Odd multipliers derived from the golden ratio for 32 and 64-bit words
+GOLDEN_GAMMA = {32: 0x9E3779B9, 64: 0x9E3779B97F4A7C15}
+
+
+def keyed_positions(key: int, total: int, start: int, count: int) -> np.ndarray:
+    # Elements start..start+count-1 of a keyed pseudo-random permutation of
+    # range(total). An unbalanced Feistel network over the smallest power of
+    # two covering `total` is a bijection; values that fall outside are
+    # encrypted again (cycle walking, less than two passes on average). Only
+    # the requested indices are ever computed, so the full permutation is
+    # never allocated
+    if start < 0 or start + count > total:
+        raise ValueError("Requested positions are outside the permutation")
+
+    bits = max(2, int(total - 1).bit_length())
+    # 32-bit words are twice as fast and enough for images under 4G samples
+    word_bits = 32 if bits <= 32 else 64
+    dtype = np.uint32 if word_bits == 32 else np.uint64
+    round_keys = _round_keys(key, dtype)
+
+    positions = _feistel(np.arange(start, start + count, dtype=dtype), bits, round_keys)
+    outside = np.flatnonzero(positions >= total)
+    while outside.size:
+        positions[outside] = _feistel(positions[outside], bits, round_keys)
+        outside = outside[positions[outside] >= total]
+
+    return positions.astype(np.intp)
+
+
+def _feistel(values: np.ndarray, bits: int, round_keys: np.ndarray) -> np.ndarray:
+    dtype = values.dtype.type
+    word_bits = values.dtype.itemsize * 8
+    multiplier = dtype(GOLDEN_GAMMA[word_bits])
+
+    left_bits = bits // 2
+    right_bits = bits - left_bits
+
+    left = values >> dtype(right_bits)
+    right = values & dtype((1 << right_bits) - 1)
+    for round_key in round_keys:
+        # Multiplicative hashing: the top bits of the product are well mixed
+        mixed = right ^ round_key
+        mixed *= multiplier
+        mixed >>= dtype(word_bits - left_bits)
+        mixed ^= left
+        left, right = right, mixed
+        left_bits, right_bits = right_bits, left_bits
+
+    return (left << dtype(right_bits)) | right
+
+
+def _round_keys(key: int, dtype) -> np.ndarray:
+    # Derived with a fixed hash so positions do not depend on the NumPy version
+    digest = hashlib.sha256(str(key).encode("utf-8")).digest()
+    word_bytes = np.dtype(dtype).itemsize
+    return np.frombuffer(
+        digest[: FEISTEL_ROUNDS * word_bytes], dtype=np.dtype(dtype).newbyteorder("<")
+    ).astype(dtype)
@@ -1,7 +1,10 @@
 from PyQt6.QtWidgets import (
     QLabel,
 )
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QTimer
+
+SMOOTH_RESCALE_DELAY_MS = 150  # Resize pause before the smooth rescale
+MIN_MIP_SIZE = 64
 
 
 class ImageLabel(QLabel):
@@ -10,20 +13,74 @@ class ImageLabel(QLabel):
         self.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.setMinimumSize(1, 1)  # Минимальный размер
         self.original_pixmap = None
+        self._mip_chain = []
+        # Last smoothly scaled pixmap and the label size it was made for
+        self._smooth_pixmap = None
+        self._smooth_size = None
+
+        self._smooth_timer = QTimer(self)
+        self._smooth_timer.setSingleShot(True)
+        self._smooth_timer.setInterval(SMOOTH_RESCALE_DELAY_MS)
+        self._smooth_timer.timeout.connect(self._smooth_rescale)
 
     def setPixmap(self, pixmap):
         self.original_pixmap = pixmap
-        self.resize_image()
+        self._mip_chain = self._build_mip_chain(pixmap)
+        self._smooth_pixmap = None
+        self._smooth_size = None
+        self._smooth_rescale()
 
     def resizeEvent(self, event):
         self.resize_image()
         super().resizeEvent(event)
 
     def resize_image(self):
-        if self.original_pixmap:
-            scaled = self.original_pixmap.scaled(
-                self.size(),
-                Qt.AspectRatioMode.KeepAspectRatio,
+        if not self.original_pixmap:
+            return
+
+        if self.size() == self._smooth_size:
+            self._smooth_timer.stop()
+            super().setPixmap(self._smooth_pixmap)
+            return
+
+        # Cheap rescale while the size keeps changing, the smooth one is
+        # done once the resizing settles
+        super().setPixmap(self._scaled(Qt.TransformationMode.FastTransformation))
+        self._smooth_timer.start()
+
+    def _smooth_rescale(self):
+        if not self.original_pixmap:
+            return
+
+        self._smooth_pixmap = self._scaled(Qt.TransformationMode.SmoothTransformation)
+        self._smooth_size = self.size()
+        super().setPixmap(self._smooth_pixmap)
+
+    def _scaled(self, mode):
+        target = self.original_pixmap.size().scaled(
+            self.size(), Qt.AspectRatioMode.KeepAspectRatio
+        )
+
+        # Scale from the smallest pre-scaled level that is still not smaller
+        # than the target
+        source = self.original_pixmap
+        for level in self._mip_chain:
+            if level.width() < target.width() or level.height() < target.height():
+                break
+            source = level
+
+        return source.scaled(target, Qt.AspectRatioMode.IgnoreAspectRatio, mode)
+
+    @staticmethod
+    def _build_mip_chain(pixmap):
+        chain = []
+        level = pixmap
+        while level.width() >= 2 * MIN_MIP_SIZE and level.height() >= 2 * MIN_MIP_SIZE:
+            level = level.scaled(
+                level.width() // 2,
+                level.height() // 2,
+                Qt.AspectRatioMode.IgnoreAspectRatio,
                 Qt.TransformationMode.SmoothTransformation,
             )
-            super().setPixmap(scaled)
+            chain.append(level)
+        return chain
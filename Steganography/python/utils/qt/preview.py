@@ -0,0 +1,48 @@
+from PyQt6.QtGui import QImage
+from PIL import Image
+import numpy as np
+
+PREVIEW_SIZE = (512, 512)
+QIMAGE_FORMATS = {
+    "L": QImage.Format.Format_Grayscale8,
+    "RGB": QImage.Format.Format_RGB888,
+    "RGBA": QImage.Format.Format_RGBA8888,
+}
+
+
+def load_preview(path, size=PREVIEW_SIZE) -> QImage:
+    with Image.open(path) as img:
+        # JPEG is decoded at a reduced scale right away, thumbnail() then
+        # shrinks by whole factors before the final resampling
+        img.draft(None, size)
+        img.thumbnail(size)
+        return image_to_qimage(img)
+
+
+def image_to_qimage(img: Image.Image) -> QImage:
+    # Indexed, grayscale and alpha images are converted in memory instead of
+    # letting Qt decode the file a second time
+    if img.mode == "P":
+        img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+    elif img.mode not in QIMAGE_FORMATS:
+        bands = img.getbands()
+        if "A" in bands:
+            img = img.convert("RGBA")
+        else:
+            img = img.convert("L" if len(bands) == 1 else "RGB")
+
+    return array_to_qimage(np.asarray(img))
+
+
+def array_to_qimage(image_array: np.ndarray) -> QImage:
+    # Wraps the pixels without copying them. The QImage keeps a reference to
+    # the array, so the buffer lives as long as the image
+    image_array = np.ascontiguousarray(image_array, dtype=np.uint8)
+    mode = "L" if image_array.ndim == 2 else {3: "RGB", 4: "RGBA"}[image_array.shape[2]]
+
+    height, width = image_array.shape[:2]
+    qimage = QImage(
+        image_array.data, width, height, image_array.strides[0], QIMAGE_FORMATS[mode]
+    )
+    qimage._buffer = image_array
+    return qimage
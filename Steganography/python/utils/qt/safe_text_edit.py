@@ -1,27 +1,66 @@
-from PyQt6.QtWidgets import QApplication, QTextEdit
+import time
+from PyQt6.QtWidgets import QPlainTextEdit, QTextEdit
 from PyQt6.QtCore import QTimer
 
+MIN_CHUNK_SIZE = 1000
+MAX_CHUNK_SIZE = 1000000
+FRAME_BUDGET = 0.008  # Seconds of appending per timer tick
 
-class SafeTextEdit(QTextEdit):
-    def __init__(self, parent=None):
-        super().__init__(parent)
+
+class _ChunkedText:
+    # Appends large text over several timer ticks. The chunk size follows
+    # the measured append time so each tick stays within the frame budget
+    def _init_chunks(self):
         self._text_queue = ""
+        self._position = 0
         self._chunk_size = 10000
         self._timer = QTimer(self)
         self._timer.timeout.connect(self._process_chunk)
 
     def set_large_text(self, text):
         self._text_queue = text
+        self._position = 0
         self.clear()
-        self._timer.start(5)
+        self._timer.start(0)
 
     def _process_chunk(self):
-        if not self._text_queue:
+        if self._position >= len(self._text_queue):
             self._timer.stop()
+            self._text_queue = ""
             return
 
-        chunk = self._text_queue[: self._chunk_size]
-        self._text_queue = self._text_queue[self._chunk_size :]
+        # Only the chunk is copied, the rest of the text stays untouched
+        end = self._position + self._chunk_size
+        chunk = self._text_queue[self._position : end]
+        self._position = end
+
+        start = time.perf_counter()
+        self._append_chunk(chunk)  # Добавляем по частям
+        elapsed = max(time.perf_counter() - start, 1e-6)
+
+        scale = min(2.0, max(0.5, FRAME_BUDGET / elapsed))
+        self._chunk_size = int(
+            min(MAX_CHUNK_SIZE, max(MIN_CHUNK_SIZE, self._chunk_size * scale))
+        )
+
+
+class SafeTextEdit(_ChunkedText, QTextEdit):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._init_chunks()
+
+    def _append_chunk(self, chunk):
+        self.append(chunk)
+
+
+class SafePlainTextEdit(_ChunkedText, QPlainTextEdit):
+    # Every chunk becomes its own block and only the visible blocks are laid
+    # out, which suits multi-megabyte keys. With max_blocks the oldest
+    # blocks are dropped past the limit
+    def __init__(self, parent=None, max_blocks=0):
+        super().__init__(parent)
+        self.setMaximumBlockCount(max_blocks)
+        self._init_chunks()
 
-        self.append(chunk)  # Добавляем по частям
-        QApplication.processEvents()  # Обрабатываем другие события
+    def _append_chunk(self, chunk):
+        self.appendPlainText(chunk)
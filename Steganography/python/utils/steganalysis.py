@@ -0,0 +1,186 @@
+import math
+from typing import Optional, Tuple
+import numpy as np
+
+CHI_SQUARE_SEGMENTS = 100
+CHI_SQUARE_MIN_EXPECTED = 5  # Pairs with fewer expected samples are skipped
+CHI_SQUARE_P_THRESHOLD = 0.5
+RS_MASK = np.array([0, 1, 1, 0], dtype=bool)
+RS_TOLERANCE = 0.05  # Estimates this far outside [0, 1] are still accepted
+GAMMA_EPS = 1e-12
+GAMMA_MAX_ITERATIONS = 500
+
+
+def chi_square_attack(
+    image_array: np.ndarray, segments: int = CHI_SQUARE_SEGMENTS
+) -> Tuple[np.ndarray, float]:
+    # Westfeld-Pfitzmann attack on pairs of values (2k, 2k+1) evaluated over
+    # growing prefixes of the samples. Returns the p-value for every prefix and
+    # the embedding rate estimated as the share of prefixes that look embedded
+    flat = image_array.reshape(-1)
+    bounds = np.linspace(0, flat.size, segments + 1).astype(np.int64)
+
+    histograms = np.stack(
+        [
+            np.bincount(flat[start:stop], minlength=256)
+            for start, stop in zip(bounds[:-1], bounds[1:])
+        ]
+    )
+    prefix_histograms = np.cumsum(histograms, axis=0)
+
+    even = prefix_histograms[:, 0::2]
+    odd = prefix_histograms[:, 1::2]
+    expected = (even + odd) / 2
+    valid = expected >= CHI_SQUARE_MIN_EXPECTED
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        terms = np.where(valid, (even - expected) ** 2 / expected, 0.0)
+    statistics = terms.sum(axis=1)
+    degrees = valid.sum(axis=1) - 1
+
+    p_values = np.array(
+        [
+            _chi_square_sf(statistic, degree) if degree > 0 else 0.0
+            for statistic, degree in zip(statistics, degrees)
+        ]
+    )
+    rate = float(np.mean(p_values > CHI_SQUARE_P_THRESHOLD))
+
+    return p_values, rate
+
+
+def rs_analysis(image_array: np.ndarray) -> Optional[float]:
+    # Fridrich RS analysis with groups of 4 horizontally adjacent samples and
+    # the [0, 1, 1, 0] mask; the estimate is averaged over channels. Returns
+    # None when no channel gives an estimate in [0, 1]
+    channels = (
+        [image_array]
+        if image_array.ndim == 2
+        else [image_array[..., c] for c in range(image_array.shape[2])]
+    )
+    group_size = RS_MASK.size
+
+    rates = []
+    for channel in channels:
+        width = channel.shape[1] // group_size * group_size
+        # One contiguous row per position inside the group keeps every
+        # operation below a long 1D pass
+        groups = (
+            channel[:, :width].reshape(-1, group_size).T.astype(np.int16, order="C")
+        )
+        rate = _rs_rate(groups)
+        if rate is not None:
+            rates.append(rate)
+
+    return float(np.mean(rates)) if rates else None
+
+
+def _rs_rate(groups: np.ndarray) -> Optional[float]:
+    r_m, s_m, r_neg_m, s_neg_m = _regular_singular(groups)
+    r_m1, s_m1, r_neg_m1, s_neg_m1 = _regular_singular(groups ^ 1)
+
+    d0 = r_m - s_m
+    d1 = r_m1 - s_m1
+    d_neg0 = r_neg_m - s_neg_m
+    d_neg1 = r_neg_m1 - s_neg_m1
+
+    # 2(d1 + d0)x^2 + (d-0 - d-1 - d1 - 3d0)x + d0 - d-0 = 0
+    a = 2 * (d1 + d0)
+    b = d_neg0 - d_neg1 - d1 - 3 * d0
+    c = d0 - d_neg0
+
+    if a == 0:
+        if b == 0:
+            return None
+        roots = [-c / b]
+    else:
+        discriminant = b * b - 4 * a * c
+        if discriminant < 0:
+            # The model does not fit this image, the rate is undetermined
+            return None
+        roots = [
+            (-b + math.sqrt(discriminant)) / (2 * a),
+            (-b - math.sqrt(discriminant)) / (2 * a),
+        ]
+
+    # p = x / (x - 1/2) lies in [0, 1] only for x <= 0; clean images land
+    # a little outside, so a small tolerance is clamped rather than rejected
+    rates = [x / (x - 0.5) for x in sorted(roots, key=abs) if x != 0.5]
+    valid = [p for p in rates if -RS_TOLERANCE <= p <= 1 + RS_TOLERANCE]
+    if not valid:
+        return None
+
+    return min(1.0, max(0.0, valid[0]))
+
+
+def _regular_singular(groups: np.ndarray) -> Tuple[float, float, float, float]:
+    rows = list(groups)
+    flipped_m = list(rows)
+    flipped_neg_m = list(rows)
+    for i in np.flatnonzero(RS_MASK):
+        lsb = rows[i] & 1
+        flipped_m[i] = rows[i] + 1 - 2 * lsb  # F1: 0 <-> 1, 2 <-> 3, ...
+        flipped_neg_m[i] = rows[i] - 1 + 2 * lsb  # F-1: -1 <-> 0, 1 <-> 2, ...
+
+    smoothness = _smoothness(rows)
+    change_m = _smoothness(flipped_m) - smoothness
+    change_neg_m = _smoothness(flipped_neg_m) - smoothness
+
+    count = smoothness.size
+    return (
+        np.count_nonzero(change_m > 0) / count,
+        np.count_nonzero(change_m < 0) / count,
+        np.count_nonzero(change_neg_m > 0) / count,
+        np.count_nonzero(change_neg_m < 0) / count,
+    )
+
+
+def _smoothness(rows) -> np.ndarray:
+    total = np.abs(rows[1] - rows[0])
+    for previous, current in zip(rows[1:-1], rows[2:]):
+        diff = current - previous
+        np.abs(diff, out=diff)
+        total += diff
+    return total
+
+
+def _chi_square_sf(statistic: float, degrees: int) -> float:
+    # P(X > statistic) for the chi-square distribution, i.e. the regularized
+    # upper incomplete gamma function Q(degrees / 2, statistic / 2)
+    a = degrees / 2
+    x = statistic / 2
+
+    if x <= 0:
+        return 1.0
+
+    log_prefix = a * math.log(x) - x - math.lgamma(a)
+
+    if x < a + 1:
+        # Series expansion of the lower function P(a, x)
+        term = total = 1 / a
+        for n in range(1, GAMMA_MAX_ITERATIONS):
+            term *= x / (a + n)
+            total += term
+            if abs(term) < abs(total) * GAMMA_EPS:
+                break
+        return max(0.0, 1 - total * math.exp(log_prefix))
+
+    # Continued fraction for Q(a, x) (modified Lentz's method)
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for n in range(1, GAMMA_MAX_ITERATIONS):
+        an = -n * (n - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < GAMMA_EPS:
+            break
+    return min(1.0, h * math.exp(log_prefix))
@@ -1,26 +1,31 @@
 import math
+from typing import Iterable, List, Tuple
 from PIL import Image
 import numpy as np
 
+MAX_PIXEL = 255.0
+CHUNK_SAMPLES = 1 << 20  # Samples compared per block, bounds temporary memory
+
 
 def psnr(original: np.ndarray, distorted: np.ndarray, mode: str) -> float:
     match mode:
-        case "P" | "L":
-            mse = mse_8bit(original, distorted)
-        case "RGB":
-            mse = mse_24bit(original, distorted)
+        case "P" | "L" | "RGB":
+            return psnr_from_mse(mse(original, distorted))
         case _:
             raise ValueError(
                 "Only 24-bit, 8-bit indexed or grayscale BMP images are supported."
             )
 
+
+def psnr_many(pairs: Iterable[Tuple[np.ndarray, np.ndarray]]) -> List[float]:
+    return [psnr_from_mse(mse(original, distorted)) for original, distorted in pairs]
+
+
+def psnr_from_mse(mse: float) -> float:
     if mse == 0:
         return float("inf")  # Images are identical
 
-    max_pixel = 255.0
-    psnr = 20 * math.log10(max_pixel / math.sqrt(mse))
-
-    return psnr
+    return 20 * math.log10(MAX_PIXEL / math.sqrt(mse))
 
 
 def generate_lsb_attack_image(
@@ -56,30 +61,36 @@ def generate_lsb_attack_image(
     return attack_img
 
 
-def mse_8bit(original: np.ndarray, distorted: np.ndarray) -> float:
-    original_array = original.astype(np.float64)
-    distorted_array = distorted.astype(np.float64)
-
-    if original_array.shape != distorted_array.shape:
+def mse(original: np.ndarray, distorted: np.ndarray) -> float:
+    if original.shape != distorted.shape:
         raise ValueError("Images must be the same size")
 
-    # Calculate MSE
-    mse = np.mean((original_array - distorted_array) ** 2)
+    if original.size == 0:
+        return 0.0
 
-    return mse
+    return sum_squared_error(original, distorted) / original.size
 
 
-def mse_24bit(original: np.ndarray, distorted: np.ndarray) -> float:
-    original_array = original.astype(np.float64)
-    distorted_array = distorted.astype(np.float64)
+def sum_squared_error(original: np.ndarray, distorted: np.ndarray) -> int:
+    # Works on any number of channels: all samples are compared in flat
+    # blocks with exact integer accumulation instead of whole-image float64 copies
+    original_flat = original.reshape(-1)
+    distorted_flat = distorted.reshape(-1)
 
-    if original_array.shape != distorted_array.shape:
-        raise ValueError("Images must be the same size")
+    total = 0
+    for start in range(0, original_flat.size, CHUNK_SAMPLES):
+        stop = start + CHUNK_SAMPLES
+        diff = original_flat[start:stop].astype(np.int64) - distorted_flat[start:stop]
+        total += int(np.dot(diff, diff))
 
-    # Calculate MSE for each channel and average it
-    mse_r = np.mean((original_array[:, :, 0] - distorted_array[:, :, 0]) ** 2)
-    mse_g = np.mean((original_array[:, :, 1] - distorted_array[:, :, 1]) ** 2)
-    mse_b = np.mean((original_array[:, :, 2] - distorted_array[:, :, 2]) ** 2)
-    mse = (mse_r + mse_g + mse_b) / 3
+    return total
 
-    return mse
+
+def mse_8bit(original: np.ndarray, distorted: np.ndarray) -> float:
+    return mse(original, distorted)
+
+
+def mse_24bit(original: np.ndarray, distorted: np.ndarray) -> float:
+    # Channels hold the same number of samples, so the mean of per-channel
+    # MSEs equals the MSE over all samples
+    return mse(original, distorted)